@@ -0,0 +1,100 @@
+"""Benchmark MergeSection.getCategorizedContours on heavily overlapping Sections.
+
+Section2 is a copy of Section1 in which every other Contour is shifted
+slightly, so half of the Contours are exact duplicates and half potential
+duplicates. Also times categorizing the same overlapping pairs with the
+list membership used before Contours were tracked by id().
+
+Run from the top-level pyrecon directory:
+    python benchmarks/bench_categorize.py [number of contours]
+"""
+import sys
+import time
+
+from pyrecon.classes import Contour, Image, Section, Transform
+from pyrecon.tools import mergetool
+
+
+def make_section(count, shift):
+    """Return a Section of <count> square Contours on a grid."""
+    transform = Transform(dim=0, xcoef=[0, 1, 0, 0, 0, 0], ycoef=[0, 0, 1, 0, 0, 0])
+    contours = []
+    for i in range(count):
+        x, y = (i % 100) * 2.0, (i // 100) * 2.0
+        dx = shift if i % 2 else 0.0
+        contours.append(Contour(
+            name="d{}".format(i % 10), closed=True, transform=transform,
+            points=[(x, y), (x + 1 + dx, y), (x + 1 + dx, y + 1), (x, y + 1)]))
+    return Section(name="bench.1", index=1, thickness=0.05, alignLocked=False,
+                   images=[Image(src="bench.tif")], contours=contours)
+
+
+def get_overlap_pairs(section1, section2):
+    """Return the (contA, contB) pairs of exact and of potential duplicates.
+
+    Pairs are in the order the original nested loop found them.
+    """
+    index = mergetool.ContourIndex(section2.contours)
+    exact_pairs = []
+    potential_pairs = []
+    for contA in section1.contours:
+        for contB in index.query(contA):
+            if not mergetool.is_contacting(contA.shape, contB.shape):
+                continue
+            elif mergetool.is_exact_duplicate(contA.shape, contB.shape):
+                exact_pairs.append((contA, contB))
+            elif mergetool.is_potential_duplicate(contA.shape, contB.shape):
+                potential_pairs.append((contA, contB))
+    return exact_pairs, potential_pairs
+
+
+def list_membership_filter(section1, section2, exact_pairs, potential_pairs):
+    """Categorize overlapping pairs with list membership, as before.
+
+    Overlapping Contours were collected in lists (with Contour.__eq__ used for
+    membership), from both exact and potential pairs.
+    """
+    complete_overlaps = [contA for contA, contB in exact_pairs]
+    sec1_overlaps = [contA for contA, contB in exact_pairs + potential_pairs]
+    sec2_overlaps = [contB for contA, contB in exact_pairs + potential_pairs]
+    potential_overlaps = [
+        [contA, contB] for contA, contB in potential_pairs
+        if not (contA in complete_overlaps and contB in complete_overlaps)
+    ]
+    return (
+        [cont for cont in section1.contours if cont not in sec1_overlaps],
+        [cont for cont in section2.contours if cont not in sec2_overlaps],
+        complete_overlaps,
+        potential_overlaps,
+    )
+
+
+def main(count=10000):
+    section1 = make_section(count, 0.0)
+    section2 = make_section(count, 0.01)
+    print("Categorizing {} x {} Contours".format(count, count))
+
+    start = time.time()
+    merge_section = mergetool.MergeSection(
+        name="bench.1", section1=section1, section2=section2)
+    print("{:>24}: {:.2f}s".format("getCategorizedContours", time.time() - start))
+    print("{:>24}: {} definite, {} potential".format(
+        "categories", len(merge_section.definite_shared_contours),
+        len(merge_section.potential_shared_contours)))
+
+    exact_pairs, potential_pairs = get_overlap_pairs(section1, section2)
+    start = time.time()
+    categories = list_membership_filter(
+        section1, section2, exact_pairs, potential_pairs)
+    print("{:>24}: {:.2f}s".format("list membership filter", time.time() - start))
+    # Both ways categorize the Contours the same
+    assert categories == (
+        merge_section.section_1_unique_contours,
+        merge_section.section_2_unique_contours,
+        merge_section.definite_shared_contours,
+        merge_section.potential_shared_contours,
+    )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
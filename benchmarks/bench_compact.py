@@ -0,0 +1,69 @@
+"""Report memory used by regular and compact pyrecon.classes objects.
+
+Builds a synthetic series of Sections, each Contour with its own Transform
+and four points, once with the regular classes and once with the compact
+ones, and reports the peak resident memory of each build.
+
+Run from the top-level pyrecon directory:
+    python benchmarks/bench_compact.py [number of contours] [contours per section]
+"""
+import resource
+import sys
+from multiprocessing import Process, Queue
+
+from pyrecon.tools.reconstruct_reader import get_classes
+
+POINTS = [(25.3974, 12.0386), (25.3225, 11.9327), (25.307, 11.8706), (25.307, 11.8112)]
+
+
+def build_sections(compact, count, per_section):
+    """Return Sections holding <count> Contours, <per_section> to a Section."""
+    (contour_class, _, section_class, transform_class,
+     _) = get_classes(compact)
+    sections = []
+    for index in range(count // per_section):
+        section = section_class(
+            name="synthetic.{}".format(index), index=index, thickness=0.05,
+            alignLocked=False)
+        for ordinal in range(per_section):
+            transform = transform_class(
+                dim=0, xcoef=[0, 1, 0, 0, 0, 0], ycoef=[0, 0, 1, 0, 0, 0])
+            section.contours.append(contour_class(
+                name="d{}".format(ordinal % 100), comment="", hidden=False,
+                closed=True, simplified=False, mode=11, border=(1.0, 0.0, 1.0),
+                fill=(1.0, 0.0, 1.0), points=POINTS, transform=transform))
+        sections.append(section)
+    return sections
+
+
+def peak_memory(compact, count, per_section, queue):
+    """Put the peak resident memory (bytes) added by building the Sections."""
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    sections = build_sections(compact, count, per_section)
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((after - before) * 1024)  # ru_maxrss is in kilobytes on Linux
+
+
+def measure(compact, count, per_section):
+    """Return the peak memory of building the Sections in a fresh process."""
+    queue = Queue()
+    process = Process(target=peak_memory, args=(compact, count, per_section, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main(count=10**6, per_section=1000):
+    print("Synthetic series: {} Contours, {} per Section".format(count, per_section))
+    regular = measure(False, count, per_section)
+    compact = measure(True, count, per_section)
+    for name, used in (("regular", regular), ("compact", compact)):
+        print("{:>8}: {:7.1f} MB, {:5.0f} bytes/Contour".format(
+            name, used / 2.0**20, float(used) / count))
+    print("   saved: {:7.1f} MB ({:.0%})".format(
+        (regular - compact) / 2.0**20, 1 - float(compact) / regular))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
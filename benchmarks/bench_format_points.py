@@ -0,0 +1,44 @@
+"""Benchmark points attribute formatting in reconstruct_writer.
+
+Run from the top-level pyrecon directory:
+    python benchmarks/bench_format_points.py [number of points]
+"""
+import sys
+import timeit
+
+from pyrecon.classes.points import to_points
+from pyrecon.tools import reconstruct_reader, reconstruct_writer
+
+DATA_LOC = "tests/tools/_data"
+
+
+def scaled_points(count):
+    """Return an (N, 2) array of <count> Contour points from the fixtures."""
+    series = reconstruct_reader.process_series_directory(DATA_LOC)
+    fixture = [pt for contour in series.sections[0].contours for pt in contour.points]
+    copies = count // len(fixture) + 1
+    return to_points((fixture * copies)[:count])
+
+
+def per_point(points):
+    """Format points one at a time, as the writer used to."""
+    return ",     ".join([" ".join(map(str, map(float, list(pt)))) for pt in points])+",     "
+
+
+def bulk(points):
+    """Format points with reconstruct_writer.format_points."""
+    return reconstruct_writer.format_points(
+        points, reconstruct_writer.STR_FLOAT + " " + reconstruct_writer.STR_FLOAT)
+
+
+def main(count=10**6, repeat=3):
+    points = scaled_points(count)
+    print("Formatting {} points (best of {})".format(len(points), repeat))
+    assert per_point(points) == bulk(points)
+    for name, function in [("per point", per_point), ("format_points", bulk)]:
+        seconds = min(timeit.repeat(lambda: function(points), number=1, repeat=repeat))
+        print("{:>20}: {:.3f}s".format(name, seconds))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
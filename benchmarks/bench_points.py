@@ -0,0 +1,48 @@
+"""Benchmark points attribute parsing in reconstruct_reader.
+
+Run from the top-level pyrecon directory:
+    python benchmarks/bench_points.py [number of points]
+"""
+import os
+import sys
+import timeit
+
+from lxml import etree
+
+from pyrecon.tools import reconstruct_reader
+
+DATA_LOC = "tests/tools/_data"
+
+
+def fixture_points():
+    """Return the points attribute strings of all Contours in the fixtures."""
+    points = []
+    for filename in ("_VRJXH.98", "_VRJXH.ser"):
+        root = etree.parse(os.path.join(DATA_LOC, filename)).getroot()
+        for node in root.iter("Contour"):
+            points.append(node.get("points").strip())
+    return points
+
+
+def scaled_points(count):
+    """Return a points attribute string with <count> points from the fixtures."""
+    fixture = " ".join(fixture_points())
+    per_copy = fixture.count(",")
+    copies = count // per_copy + 1
+    return " ".join([fixture] * copies)
+
+
+def main(count=10**6, repeat=3):
+    points = scaled_points(count)
+    print("Parsing {} points (best of {})".format(points.count(","), repeat))
+    timings = [
+        ("_get_points_float", reconstruct_reader._get_points_float),
+        ("get_points_array", reconstruct_reader.get_points_array),
+    ]
+    for name, function in timings:
+        seconds = min(timeit.repeat(lambda: function(points), number=1, repeat=repeat))
+        print("{:>20}: {:.3f}s".format(name, seconds))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,70 @@
+"""Time loading Sections with and without change tracking.
+
+Writes a synthetic Section file, then times parsing it with
+process_section_file and loading it from its binary cache, each with
+track_changes off and on. Tracking marks each loaded Section clean, which
+fingerprints all of its Contours.
+
+Run from the top-level pyrecon directory:
+    python benchmarks/bench_track_changes.py [number of contours] [repeats]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+from pyrecon.classes import Contour, Section, Transform
+from pyrecon.tools import reconstruct_writer, section_cache
+from pyrecon.tools.reconstruct_reader import process_section_file
+
+POINTS = [(25.3974, 12.0386), (25.3225, 11.9327), (25.307, 11.8706), (25.307, 11.8112)]
+
+
+def make_section(count):
+    """Return a Section of <count> Contours, sharing 100 Transforms."""
+    section = Section(
+        name="synthetic.1", index=1, thickness=0.05, alignLocked=False)
+    transforms = [
+        Transform(dim=1, xcoef=[i, 1, 0, 0, 0, 0], ycoef=[0, 0, 1, 0, 0, 0])
+        for i in range(100)]
+    for ordinal in range(count):
+        section.contours.append(Contour(
+            name="d{}".format(ordinal % 100), comment="", hidden=False,
+            closed=True, simplified=False, mode=11, border=(1.0, 0.0, 1.0),
+            fill=(1.0, 0.0, 1.0), points=POINTS,
+            transform=transforms[ordinal % 100]))
+    return section
+
+
+def best_time(function, repeats):
+    """Return the fastest of <repeats> calls of function, in seconds."""
+    return min(timeit.repeat(function, number=1, repeat=repeats))
+
+
+def main(count=100000, repeats=3):
+    tempdir = tempfile.mkdtemp()
+    try:
+        section = make_section(count)
+        reconstruct_writer.write_section(section, tempdir)
+        path = os.path.join(tempdir, section.name)
+        cache_path = section_cache.get_cache_path(path)
+        section_cache.process_section_file_cached(path)
+
+        print("Synthetic Section: {} Contours".format(count))
+        for name, load in (
+                ("XML parse", lambda track: process_section_file(
+                    path, track_changes=track)),
+                ("cache hit", lambda track: section_cache.load_section(
+                    cache_path, section_cache.get_file_key(path),
+                    track_changes=track))):
+            untracked = best_time(lambda: load(False), repeats)
+            tracked = best_time(lambda: load(True), repeats)
+            print("{:>10}: {:6.2f}s untracked, {:6.2f}s tracked (+{:.0%})".format(
+                name, untracked, tracked, tracked / untracked - 1))
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,38 @@
+"""Benchmark the inverse of polynomial Transforms.
+
+Run from the top-level pyrecon directory:
+    python benchmarks/bench_transform.py [number of points]
+"""
+import sys
+import timeit
+
+import numpy
+
+from pyrecon.classes import Transform
+from pyrecon.classes.transform import polynomial_inverse, polynomial_inverse_scalar
+
+XCOEF = [0.5, 1.01, 0.02, 0.0001, 0.0002, 0.0003]
+YCOEF = [0.25, 0.01, 0.99, 0.0003, 0.0001, 0.0002]
+
+
+def main(count=2000, repeat=3):
+    tform = Transform(dim=6, xcoef=XCOEF, ycoef=YCOEF)._tform
+    # A trace along a circle, in RECONSTRUCT units
+    angles = numpy.linspace(0, 2 * numpy.pi, count)
+    points = tform(numpy.column_stack((20 + 5 * numpy.cos(angles),
+                                       15 + 5 * numpy.sin(angles))))
+
+    print("Inverting {} points (best of {})".format(count, repeat))
+    results = {}
+    for function in (polynomial_inverse_scalar, polynomial_inverse):
+        results[function] = function(tform, XCOEF, YCOEF, points)
+        seconds = min(timeit.repeat(
+            lambda: function(tform, XCOEF, YCOEF, points), number=1, repeat=repeat))
+        print("{:>26}: {:.4f}s".format(function.__name__, seconds))
+    difference = numpy.abs(
+        results[polynomial_inverse] - results[polynomial_inverse_scalar]).max()
+    print("{:>26}: {:.3g}".format("max difference", difference))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -1,15 +1,27 @@
 """Main, overarching functions that are used in multiple modules."""
 
 
-def openSeries(path):
-    """Returns a Series object with associated Sections from the same directory."""
+def openSeries(path, workers=None, threads=False, lazy=False, cache_size=64,
+               compact=False, cache=False, cache_dir=None, track_changes=False):
+    """Returns a Series object with associated Sections from the same directory.
+
+    Sections are loaded in parallel by <workers> processes (or threads) when
+    <workers> is greater than 1, or on first access if <lazy> is True. If
+    <compact> is True, objects are built from pyrecon.classes.compact classes.
+    If <cache> is True, Sections are loaded from binary caches (in <cache_dir>
+    if given) when up to date, and cached otherwise. If <track_changes> is
+    True, is_dirty() reports changes made to the Series and Sections since.
+    """
     import os
     from pyrecon.tools.reconstruct_reader import process_series_directory
 
     if ".ser" in path:
         path = os.path.dirname(path)
 
-    series = process_series_directory(path)
+    series = process_series_directory(
+        path, workers=workers, threads=threads, lazy=lazy,
+        cache_size=cache_size, compact=compact, cache=cache,
+        cache_dir=cache_dir, track_changes=track_changes)
 
     return series
 
@@ -1,5 +1,6 @@
 from contour import Contour
 from image import Image
+from points import Points
 from section import Section
 from series import Series
 from transform import Transform
@@ -9,6 +10,7 @@ from zcontour import ZContour
 __all__ = [
     "Contour",
     "Image",
+    "Points",
     "Section",
     "Series",
     "Transform",
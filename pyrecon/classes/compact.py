@@ -0,0 +1,30 @@
+"""Compact variants of the pyrecon.classes model.
+
+Each Compact class has the same attributes and methods as the class it is
+built from, but stores its attributes in __slots__ instead of a per-instance
+__dict__. New attributes cannot be added to Compact instances.
+"""
+from pyrecon.classes.contour import Contour
+from pyrecon.classes.image import Image
+from pyrecon.classes.section import Section
+from pyrecon.classes.transform import Transform
+from pyrecon.classes.zcontour import ZContour
+
+
+def compact_class(cls):
+    """Return a copy of cls that stores its instance attributes in __slots__."""
+    namespace = {
+        k: v for k, v in vars(cls).items()
+        if k not in ("__dict__", "__weakref__")
+    }
+    # Slots are the attributes set by the constructor
+    namespace["__slots__"] = tuple(sorted(vars(cls())))
+    namespace["__module__"] = __name__
+    return type("Compact" + cls.__name__, (object,), namespace)
+
+
+CompactContour = compact_class(Contour)
+CompactImage = compact_class(Image)
+CompactSection = compact_class(Section)
+CompactTransform = compact_class(Transform)
+CompactZContour = compact_class(ZContour)
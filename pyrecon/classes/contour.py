@@ -1,7 +1,14 @@
 """Contour."""
+import hashlib
+
 import numpy
 from shapely.geometry import LineString, Point, Polygon
 
+from pyrecon.classes.points import to_points
+
+# Normalized Polygon points are rounded to multiples of this for content_hash
+HASH_QUANTUM = 1e-9
+
 
 class Contour(object):
     """Class representing a RECONSTRUCT Contour."""
@@ -19,6 +26,8 @@ class Contour(object):
         self.points = kwargs.get("points", [])
         # Non-RECONSTRUCT attributes
         self.transform = kwargs.get("transform")
+        self._shape = None  # (transform key, Shapely shape)
+        self._content_hash = None
 
     def __repr__(self):
         """Return a string representation of this Contour's data."""
@@ -50,12 +59,106 @@ class Contour(object):
         """Allow use of != between multiple contours."""
         return not self.__eq__(other)
 
+    def __getstate__(self):
+        """Return picklable state, leaving out the cached shape and hash."""
+        return {
+            "name": self.name,
+            "comment": self.comment,
+            "hidden": self.hidden,
+            "closed": self.closed,
+            "simplified": self.simplified,
+            "mode": self.mode,
+            "border": self.border,
+            "fill": self.fill,
+            "points": self.points,
+            "transform": self.transform,
+        }
+
+    def __setstate__(self, state):
+        """Restore state returned by __getstate__."""
+        self.__init__(**state)
+
+    @property
+    def name(self):
+        """Return name of this Contour."""
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        self._name = name
+        self._content_hash = None
+
+    @property
+    def points(self):
+        """Return Points of this Contour."""
+        return self._points
+
+    @points.setter
+    def points(self, points):
+        self._points = to_points(points)
+        self._shape = None
+
+    @property
+    def closed(self):
+        """Return True if this Contour is closed."""
+        return self._closed
+
+    @closed.setter
+    def closed(self, closed):
+        self._closed = closed
+        self._shape = None
+
+    @property
+    def transform(self):
+        """Return Transform of this Contour."""
+        return self._transform
+
+    @transform.setter
+    def transform(self, transform):
+        self._transform = transform
+        self._shape = None
+
     @property
     def shape(self):
-        """Return a Shapely geometric object."""
+        """Return a Shapely geometric object.
+
+        The shape is cached until points, closed or transform are reassigned,
+        or the transform's coefficients change. Points edited in place are not
+        noticed.
+        """
         if not self.points:
             raise Exception("No points found: {}".format(self))
 
+        key = self.transform.key()
+        if self._shape is None or self._shape[0] != key:
+            self._shape = (key, self._make_shape())
+            self._content_hash = None
+        return self._shape[1]
+
+    def content_hash(self):
+        """Return a hash of name, closed, transform and normalized points.
+
+        Contours with equal hashes are exact duplicates. Polygon points are
+        quantized to HASH_QUANTUM, far below the precision of RECONSTRUCT
+        files; Points and LineStrings must match exactly, as they do for
+        mergetool.is_exact_duplicate. Cached along with shape, and until name
+        is reassigned.
+        """
+        shape = self.shape
+        if self._content_hash is None:
+            if isinstance(shape, Polygon):
+                coords = numpy.round(
+                    numpy.asarray(shape.exterior.coords) / HASH_QUANTUM)
+            else:
+                coords = numpy.asarray(shape.coords)
+            content = hashlib.sha1(repr(
+                (self.name, self.closed, self.transform.key(), shape.type)))
+            content.update(coords.tostring())
+            self._content_hash = content.hexdigest()
+        return self._content_hash
+
+    def _make_shape(self):
+        """Return a new Shapely geometric object."""
         # Normalize points
         array = numpy.asarray(self.points)
         normalized_points = self.transform._tform.inverse(array)
@@ -0,0 +1,44 @@
+"""Fingerprints of Section and Series data, for detecting modifications."""
+import hashlib
+from operator import attrgetter
+
+import numpy
+
+# Attributes of Contours, Images and ZContours that are written to XML
+OBJECT_ATTRIBUTES = (
+    "name", "comment", "hidden", "closed", "simplified", "mode", "border",
+    "fill", "src", "mag", "contrast", "brightness", "red", "green", "blue",
+)
+# Number of objects whose points are hashed together
+CHUNK_SIZE = 4096
+
+
+def fingerprint(attributes, *groups):
+    """Return a SHA-1 hex digest of an attributes dict and groups of objects.
+
+    Each group is a sequence of Contour-like objects, whose OBJECT_ATTRIBUTES,
+    Transform and points are included.
+    """
+    sha1 = hashlib.sha1(repr(sorted(attributes.items())))
+    getters = {}  # class: attrgetter for its OBJECT_ATTRIBUTES
+    for group in groups:
+        states = []
+        point_arrays = []
+        for obj in group:
+            getter = getters.get(type(obj))
+            if getter is None:
+                getter = getters[type(obj)] = attrgetter(*[
+                    name for name in OBJECT_ATTRIBUTES if hasattr(obj, name)])
+            transform = getattr(obj, "transform", None)
+            points = numpy.asarray(obj.points, dtype=numpy.float64)
+            states.append((
+                getter(obj),
+                transform.key() if transform is not None else None,
+                points.shape,
+            ))
+            point_arrays.append(points.ravel())
+        sha1.update(repr(states))
+        for start in range(0, len(point_arrays), CHUNK_SIZE):
+            sha1.update(numpy.concatenate(
+                point_arrays[start:start + CHUNK_SIZE]).tostring())
+    return sha1.hexdigest()
@@ -1,4 +1,5 @@
 """Image."""
+from pyrecon.classes.points import to_points
 
 
 class Image(object):
@@ -23,7 +24,7 @@ class Image(object):
         self.border = kwargs.get("border")
         self.fill = kwargs.get("fill")
         self.mode = kwargs.get("mode")
-        self.points = kwargs.get("points", [])
+        self.points = to_points(kwargs.get("points", []))
 
         # Metadata
         self._path = kwargs.get("_path")
@@ -0,0 +1,84 @@
+"""Points."""
+import numpy
+
+
+class Points(numpy.ndarray):
+    """Class representing RECONSTRUCT points as an (N, 2) or (N, 3) float array.
+
+    Points stand in for the lists of point tuples used elsewhere: == and !=
+    compare whole point sets and return a bool, <in> looks for a whole point,
+    and a Points is falsy only when it has no points. Indexing that selects
+    points (e.g. points[0] or points[1:]) returns Points, while indexing
+    coordinates (e.g. points[:, 0]) and arithmetic return plain NumPy arrays.
+    """
+
+    def __getitem__(self, index):
+        """Return selected points as Points, and anything else as an array."""
+        result = numpy.ndarray.__getitem__(self, index)
+        if isinstance(result, Points) and not selects_points(index):
+            return result.view(numpy.ndarray)
+        return result
+
+    def __contains__(self, point):
+        """Return True if <point> (a point tuple) is one of these points.
+
+        For a single point, return True if <point> is one of its coordinates.
+        """
+        array = self.view(numpy.ndarray)
+        if array.ndim != 2:
+            return point in array.tolist()
+        try:
+            point = numpy.asarray(point, dtype=numpy.float64)
+        except (TypeError, ValueError):
+            return False
+        if point.shape != array.shape[1:]:
+            return False
+        return bool((array == point).all(axis=1).any())
+
+    def __array_wrap__(self, array, context=None):
+        """Return ufunc results as plain arrays (or scalars)."""
+        array = numpy.ndarray.__array_wrap__(self, array, context)
+        if array.ndim == 0:
+            return array[()]
+        return array.view(numpy.ndarray)
+
+    def __eq__(self, other):
+        """Allow use of == with Points or sequences of point tuples."""
+        try:
+            other = numpy.asarray(other, dtype=numpy.float64)
+        except (TypeError, ValueError):
+            return False
+        if not self.size and not other.size:
+            return True
+        return (self.shape == other.shape and
+                bool((self.view(numpy.ndarray) == other).all()))
+
+    def __ne__(self, other):
+        """Allow use of != with Points or sequences of point tuples."""
+        return not self.__eq__(other)
+
+    def __nonzero__(self):
+        """Return True if there are any points."""
+        return len(self) > 0
+
+    __bool__ = __nonzero__
+
+
+def selects_points(index):
+    """Return True if Points[index] only selects points, not coordinates."""
+    if not isinstance(index, tuple):
+        return index is not None
+    if not index or index[0] is None or index[0] is Ellipsis:
+        return False
+    return all(
+        isinstance(i, slice) and i == slice(None) for i in index[1:])
+
+
+def to_points(points, width=2):
+    """Return <points>, a sequence of point tuples, as Points."""
+    if isinstance(points, Points):
+        return points
+    array = numpy.asarray(points, dtype=numpy.float64)
+    if not array.size:
+        array = array.reshape((0, width))
+    return array.view(Points)
@@ -1,4 +1,5 @@
 """Section."""
+from pyrecon.classes.fingerprint import fingerprint
 
 
 class Section(object):
@@ -14,6 +15,8 @@ class Section(object):
         self.images = kwargs.get("images", [])  # TODO: d1fixed
         self.contours = kwargs.get("contours", [])
         self._path = kwargs.get("_path")
+        # fingerprint() when last in sync with the file at _path, if ever
+        self._clean_fingerprint = kwargs.get("_clean_fingerprint")
 
 # ACCESSORS
     def __len__(self):
@@ -57,3 +60,16 @@ class Section(object):
             "thickness": self.thickness,
             "alignLocked": self.alignLocked
         }
+
+    def fingerprint(self):
+        """Return a digest of this Section's attributes, Images and Contours."""
+        return fingerprint(self.attributes(), self.images, self.contours)
+
+    def mark_clean(self):
+        """Record that this Section matches its file."""
+        self._clean_fingerprint = self.fingerprint()
+
+    def is_dirty(self):
+        """Return True if modified since last marked clean (or never marked)."""
+        return (self._clean_fingerprint is None or
+                self._clean_fingerprint != self.fingerprint())
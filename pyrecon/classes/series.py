@@ -1,4 +1,5 @@
 """Series."""
+from pyrecon.classes.fingerprint import fingerprint
 
 
 class Series(object):
@@ -98,9 +99,39 @@ class Series(object):
         self.contours = kwargs.get("contours", [])
         self.zcontours = kwargs.get("zcontours", [])
         self.sections = kwargs.get("sectons", [])
+        # Metadata for refresh()
+        self._file_stats = kwargs.get("_file_stats", {})  # path: (size, mtime)
+        self._load_options = kwargs.get("_load_options", {})
+        # fingerprint() when last in sync with the Series file, if ever
+        self._clean_fingerprint = kwargs.get("_clean_fingerprint")
 
     def attributes(self):
         """Return a dict of this Series" attributes."""
-        ignore = ["name", "path", "contours", "zcontours", "sections"]
+        ignore = ["name", "path", "contours", "zcontours", "sections",
+                  "_file_stats", "_load_options", "_clean_fingerprint"]
         attributes = {k: v for k, v in self.__dict__.iteritems() if k not in ignore}
         return attributes
+
+    def fingerprint(self):
+        """Return a digest of this Series' attributes, Contours and ZContours."""
+        return fingerprint(self.attributes(), self.contours, self.zcontours)
+
+    def mark_clean(self):
+        """Record that this Series matches its Series file."""
+        self._clean_fingerprint = self.fingerprint()
+
+    def is_dirty(self):
+        """Return True if modified since last marked clean (or never marked).
+
+        Only the Series file's data is considered, not the Sections.
+        """
+        return (self._clean_fingerprint is None or
+                self._clean_fingerprint != self.fingerprint())
+
+    def refresh(self, workers=None, threads=False):
+        """Reload changed Series and Section files, returning what changed.
+
+        See pyrecon.tools.reconstruct_reader.refresh_series.
+        """
+        from pyrecon.tools.reconstruct_reader import refresh_series
+        return refresh_series(self, workers=workers, threads=threads)
@@ -1,8 +1,144 @@
 """Transform."""
+from functools import partial
+
 import numpy as np
 from skimage import transform as tf
 
 
+def polynomial_inverse_scalar(tforward, a, b, pts):
+    """Return pts mapped through the inverse of polynomial tforward, one at a time.
+
+    <a> and <b> are the RECONSTRUCT xcoef and ycoef of tforward. Each point is
+    solved by Newton's method, falling back to the Jacobian transpose where the
+    Jacobian is singular.
+    """
+    newpts = []  # list of final estimates of (x,y)
+    for i in range(len(pts)):
+        # (u,v) for which we want (x,y)
+        u, v = pts[i, 0], pts[i, 1]  # input pts
+        # initial guess of (x,y)
+        x0, y0 = 0.0, 0.0
+        # get forward tform of initial guess
+        uv0 = tforward(np.array([x0, y0]).reshape([1, 2]))[0]
+        u0 = uv0[0]
+        v0 = uv0[1]
+        e = 1.0  # reduce error to this limit
+        epsilon = 5e-10
+        i = 0
+        while e > epsilon and i < 100:  # NOTE: 10 -> 100
+            i += 1
+            # compute Jacobian
+            l = a[1] + a[3] * y0 + 2.0 * a[4] * x0
+            m = a[2] + a[3] * x0 + 2.0 * a[5] * y0
+            n = b[1] + b[3] * y0 + 2.0 * b[4] * x0
+            o = b[2] + b[3] * x0 + 2.0 * b[5] * y0
+            p = l * o - m * n  # determinant for inverse
+            if abs(p) > epsilon:
+                # increment x0,y0 by inverse of Jacobian
+                x0 = x0 + ((o * (u - u0) - m * (v - v0)) / p)
+                y0 = y0 + ((l * (v - v0) - n * (u - u0)) / p)
+            else:
+                # try Jacobian transpose instead
+                x0 = x0 + (l * (u - u0) + n * (v - v0))
+                y0 = y0 + (m * (u - u0) + o * (v - v0))
+            # get forward tform of current guess
+            uv0 = tforward(np.array([x0, y0]).reshape([1, 2]))[0]
+            u0 = uv0[0]
+            v0 = uv0[1]
+            # compute closeness to goal
+            e = abs(u - u0) + abs(v - v0)
+        # append final estimate of (x,y) to newpts list
+        newpts.append((x0, y0))
+    newpts = np.asarray(newpts)
+    return newpts
+
+
+def polynomial_inverse(tforward, a, b, pts, epsilon=5e-10, max_iterations=100):
+    """Return pts mapped through the inverse of polynomial tforward.
+
+    Vectorized equivalent of polynomial_inverse_scalar: Newton's method is run
+    on all points at once, and each point stops iterating once it is within
+    <epsilon> of its target.
+    """
+    pts = np.asarray(pts, dtype=np.float64).reshape((-1, 2))
+    u, v = pts[:, 0], pts[:, 1]  # input pts
+    # initial guess of (x,y)
+    x0 = np.zeros(len(pts))
+    y0 = np.zeros(len(pts))
+    # get forward tform of initial guess
+    uv0 = tforward(np.column_stack((x0, y0)))
+    u0, v0 = uv0[:, 0].copy(), uv0[:, 1].copy()
+    active = np.ones(len(pts), dtype=bool)  # points still iterating
+    for _ in range(max_iterations):
+        idx = np.flatnonzero(active)
+        if not idx.size:
+            break
+        x, y = x0[idx], y0[idx]
+        du, dv = u[idx] - u0[idx], v[idx] - v0[idx]
+        # compute Jacobian
+        l = a[1] + a[3] * y + 2.0 * a[4] * x
+        m = a[2] + a[3] * x + 2.0 * a[5] * y
+        n = b[1] + b[3] * y + 2.0 * b[4] * x
+        o = b[2] + b[3] * x + 2.0 * b[5] * y
+        p = l * o - m * n  # determinant for inverse
+        invertible = np.abs(p) > epsilon
+        p = np.where(invertible, p, 1.0)
+        # increment x0,y0 by inverse of Jacobian, or else its transpose
+        x0[idx] = np.where(
+            invertible, x + ((o * du - m * dv) / p), x + (l * du + n * dv))
+        y0[idx] = np.where(
+            invertible, y + ((l * dv - n * du) / p), y + (m * du + o * dv))
+        # get forward tform of current guesses
+        uv0 = tforward(np.column_stack((x0[idx], y0[idx])))
+        u0[idx], v0[idx] = uv0[:, 0], uv0[:, 1]
+        # compute closeness to goal
+        e = np.abs(u[idx] - u0[idx]) + np.abs(v[idx] - v0[idx])
+        active[idx] = e > epsilon
+    return np.column_stack((x0, y0))
+
+
+def compile_tform(dim, xcoef, ycoef):
+    """Return a skimage transform object from RECONSTRUCT dim and coefficients."""
+    if not xcoef or not ycoef or dim is None:
+        return None
+    a = xcoef
+    b = ycoef
+    # Affine transform
+    if dim in range(0, 4):
+        if dim == 0:
+            tmatrix = np.array(
+                [1, 0, 0, 0, 1, 0, 0, 0, 1]
+            ).reshape((3, 3))
+        elif dim == 1:
+            tmatrix = np.array(
+                [1, 0, a[0], 0, 1, b[0], 0, 0, 1]
+            ).reshape((3, 3))
+        elif dim == 2:  # Special case, swap b[1] and b[2] (look at original Reconstruct code: nform.cpp)
+            tmatrix = np.array(
+                [a[1], 0, a[0], 0, b[1], b[0], 0, 0, 1]
+            ).reshape((3, 3))
+        elif dim == 3:
+            tmatrix = np.array(
+                [a[1], a[2], a[0], b[1], b[2], b[0], 0, 0, 1]
+            ).reshape((3, 3))
+        return tf.AffineTransform(tmatrix)
+    # Polynomial transform
+    elif dim in range(4, 7):
+        tmatrix = np.array(
+            [a[0], a[1], a[2], a[4], a[3], a[5], b[0], b[1], b[2], b[4], b[3], b[5]]
+        ).reshape((2, 6))
+        # create matrix of coefficients
+        tforward = tf.PolynomialTransform(tmatrix)
+
+        tforward.inverse = partial(polynomial_inverse, tforward, a, b)
+        return tforward
+
+
+# Compiled skimage transforms, shared between Transforms with equal keys
+_compiled_tforms = {}
+_COMPILED_TFORMS_SIZE = 4096
+
+
 class Transform(object):
     """Class representing a RECONSTRUCT Transform."""
 
@@ -11,86 +147,39 @@ class Transform(object):
         self.dim = kwargs.get("dim")
         self.xcoef = kwargs.get("xcoef")
         self.ycoef = kwargs.get("ycoef")
+        # Non-RECONSTRUCT attributes
+        self._compiled = None  # (key, skimage transform)
+
+    def __getstate__(self):
+        """Return picklable state, leaving out the compiled transform."""
+        return {"dim": self.dim, "xcoef": self.xcoef, "ycoef": self.ycoef}
+
+    def __setstate__(self, state):
+        """Restore state returned by __getstate__."""
+        self.__init__(**state)
+
+    def key(self):
+        """Return a hashable key of this Transform's dim and coefficients."""
+        return (self.dim, tuple(self.xcoef or ()), tuple(self.ycoef or ()))
 
     @property
     def _tform(self):
-        """Return a skimage transform object."""
-        xcoef = self.xcoef
-        ycoef = self.ycoef
-        dim = self.dim
-        if not xcoef or not ycoef or dim is None:
-            return None
-        a = xcoef
-        b = ycoef
-        # Affine transform
-        if dim in range(0, 4):
-            if dim == 0:
-                tmatrix = np.array(
-                    [1, 0, 0, 0, 1, 0, 0, 0, 1]
-                ).reshape((3, 3))
-            elif dim == 1:
-                tmatrix = np.array(
-                    [1, 0, a[0], 0, 1, b[0], 0, 0, 1]
-                ).reshape((3, 3))
-            elif dim == 2:  # Special case, swap b[1] and b[2] (look at original Reconstruct code: nform.cpp)
-                tmatrix = np.array(
-                    [a[1], 0, a[0], 0, b[1], b[0], 0, 0, 1]
-                ).reshape((3, 3))
-            elif dim == 3:
-                tmatrix = np.array(
-                    [a[1], a[2], a[0], b[1], b[2], b[0], 0, 0, 1]
-                ).reshape((3, 3))
-            return tf.AffineTransform(tmatrix)
-        # Polynomial transform
-        elif dim in range(4, 7):
-            tmatrix = np.array(
-                [a[0], a[1], a[2], a[4], a[3], a[5], b[0], b[1], b[2], b[4], b[3], b[5]]
-            ).reshape((2, 6))
-            # create matrix of coefficients
-            tforward = tf.PolynomialTransform(tmatrix)
-
-            def getrevt(pts):  # pts are a np.array
-                newpts = []  # list of final estimates of (x,y)
-                for i in range(len(pts)):
-                    # (u,v) for which we want (x,y)
-                    u, v = pts[i, 0], pts[i, 1]  # input pts
-                    # initial guess of (x,y)
-                    x0, y0 = 0.0, 0.0
-                    # get forward tform of initial guess
-                    uv0 = tforward(np.array([x0, y0]).reshape([1, 2]))[0]
-                    u0 = uv0[0]
-                    v0 = uv0[1]
-                    e = 1.0  # reduce error to this limit
-                    epsilon = 5e-10
-                    i = 0
-                    while e > epsilon and i < 100:  # NOTE: 10 -> 100
-                        i += 1
-                        # compute Jacobian
-                        l = a[1] + a[3] * y0 + 2.0 * a[4] * x0
-                        m = a[2] + a[3] * x0 + 2.0 * a[5] * y0
-                        n = b[1] + b[3] * y0 + 2.0 * b[4] * x0
-                        o = b[2] + b[3] * x0 + 2.0 * b[5] * y0
-                        p = l * o - m * n  # determinant for inverse
-                        if abs(p) > epsilon:
-                            # increment x0,y0 by inverse of Jacobian
-                            x0 = x0 + ((o * (u - u0) - m * (v - v0)) / p)
-                            y0 = y0 + ((l * (v - v0) - n * (u - u0)) / p)
-                        else:
-                            # try Jacobian transpose instead
-                            x0 = x0 + (l * (u - u0) + n * (v - v0))
-                            y0 = y0 + (m * (u - u0) + o * (v - v0))
-                        # get forward tform of current guess
-                        uv0 = tforward(np.array([x0, y0]).reshape([1, 2]))[0]
-                        u0 = uv0[0]
-                        v0 = uv0[1]
-                        # compute closeness to goal
-                        e = abs(u - u0) + abs(v - v0)
-                    # append final estimate of (x,y) to newpts list
-                    newpts.append((x0, y0))
-                newpts = np.asarray(newpts)
-                return newpts
-            tforward.inverse = getrevt
-            return tforward
+        """Return a skimage transform object.
+
+        The skimage transform is built once per distinct key() and shared by
+        all Transforms with that key. It is rebuilt when dim, xcoef or ycoef
+        change.
+        """
+        key = self.key()
+        if self._compiled is None or self._compiled[0] != key:
+            try:
+                tform = _compiled_tforms[key]
+            except KeyError:
+                if len(_compiled_tforms) >= _COMPILED_TFORMS_SIZE:
+                    _compiled_tforms.clear()
+                tform = _compiled_tforms[key] = compile_tform(*key)
+            self._compiled = (key, tform)
+        return self._compiled[1]
 
     def __eq__(self, other):
         """Allow use of == operator."""
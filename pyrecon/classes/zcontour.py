@@ -2,6 +2,8 @@
 import numpy
 from shapely.geometry import LineString, Polygon
 
+from pyrecon.classes.points import to_points
+
 
 class ZContour(object):
     """Class representing a RECONSTRUCT ZContour."""
@@ -13,7 +15,7 @@ class ZContour(object):
         self.border = kwargs.get("border")
         self.fill = kwargs.get("fill")
         self.mode = kwargs.get("mode")
-        self.points = kwargs.get("points", [])
+        self.points = to_points(kwargs.get("points", []), width=3)
 
     def __eq__(self, other):
         """Allow use of == operator."""
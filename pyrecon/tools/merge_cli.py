@@ -0,0 +1,126 @@
+"""Command-line tool for merging RECONSTRUCT Series without a display.
+
+Merge one pair of Series:
+    python -m pyrecon.tools.merge_cli SERIES_A SERIES_B OUTPUT --policy union
+
+Or many, listed in a batch file:
+    python -m pyrecon.tools.merge_cli --batch pairs.txt --workers 8
+
+Each line of a batch file holds the SERIES_A, SERIES_B and OUTPUT paths of one
+merge, separated by whitespace. Blank lines and lines starting with # are
+skipped. Conflicts are resolved by the policy given (see
+MergeSection.autoResolve).
+"""
+import argparse
+import os
+import sys
+from functools import partial
+
+from pyrecon import openSeries
+from pyrecon.tools.mergetool import POLICIES, PREFER_A, createMergeSet
+from pyrecon.tools.workers import pool_map
+
+
+def merge_series(path1, path2, outpath, policy=PREFER_A, workers=None,
+                 overwrite=False):
+    """Merge the Series at path1 and path2 and write the result to outpath.
+
+    Both Series are loaded at once, their Sections read by <workers> threads
+    each. MergeSections are built, and merged Sections written, by <workers>
+    processes. Return the names of the merges resolved by <policy>.
+    """
+    if policy not in POLICIES:
+        raise ValueError("Unknown merge policy: {}".format(policy))
+    # Fail before the (slow) merge rather than when writing
+    if not overwrite and os.path.isdir(outpath) and os.listdir(outpath):
+        raise IOError("Output directory {} is not empty".format(outpath))
+
+    series1, series2 = pool_map(
+        partial(openSeries, workers=workers, threads=True), [path1, path2],
+        workers=2, threads=True)
+    merge_set = createMergeSet(series1, series2, workers=workers)
+    resolved = merge_set.autoResolve(policy)
+    merge_set.writeMergeSet(outpath, overwrite=True, workers=workers)
+    return resolved
+
+
+def read_batch_file(path):
+    """Return a list of (series_a, series_b, output) paths from a batch file."""
+    merges = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            paths = line.split()
+            if len(paths) != 3:
+                raise ValueError(
+                    "{} line {}: expected SERIES_A SERIES_B OUTPUT".format(
+                        path, number))
+            merges.append(tuple(paths))
+    return merges
+
+
+def main(argv=None):
+    """Run the merges given by command-line arguments <argv>.
+
+    Return 0 if all merges succeeded, else 1. A failed merge is reported and
+    the remaining merges are still run.
+    """
+    parser = argparse.ArgumentParser(
+        description="Merge RECONSTRUCT Series without a display.")
+    parser.add_argument(
+        "paths", nargs="*", metavar="PATH",
+        help="SERIES_A SERIES_B OUTPUT: Series directories (or .ser files) "
+             "and the output directory")
+    parser.add_argument(
+        "--batch", metavar="FILE",
+        help="file of SERIES_A SERIES_B OUTPUT lines to merge")
+    parser.add_argument(
+        "--policy", choices=POLICIES, default=PREFER_A,
+        help="resolve conflicts with Series A's version, Series B's version, "
+             "or the union of their contours (default: %(default)s)")
+    parser.add_argument(
+        "--workers", type=int, default=None,
+        help="number of worker processes (and threads) per merge")
+    parser.add_argument(
+        "--overwrite", action="store_true",
+        help="write into non-empty output directories")
+    parser.add_argument(
+        "--quiet", action="store_true", help="only report failures")
+    args = parser.parse_args(argv)
+
+    merges = []
+    if args.paths:
+        if len(args.paths) != 3:
+            parser.error("expected SERIES_A SERIES_B OUTPUT")
+        merges.append(tuple(args.paths))
+    if args.batch:
+        try:
+            merges.extend(read_batch_file(args.batch))
+        except (IOError, ValueError) as e:
+            parser.error(str(e))
+    if not merges:
+        parser.error("nothing to merge")
+
+    failures = 0
+    for path1, path2, outpath in merges:
+        try:
+            resolved = merge_series(
+                path1, path2, outpath, policy=args.policy,
+                workers=args.workers, overwrite=args.overwrite)
+        except Exception as e:
+            failures += 1
+            sys.stderr.write("Failed to merge {} and {}: {}\n".format(
+                path1, path2, e))
+            continue
+        if not args.quiet:
+            sys.stdout.write(
+                "Merged {} and {} into {} ({} with conflicts resolved by "
+                "policy {})\n".format(
+                    path1, path2, outpath, len(resolved), args.policy))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,28 @@
 """Merge two RECONSTRUCT datasets."""
+import gzip
+import json
+import os
+
+import numpy
 from shapely.geometry import box, LinearRing, LineString, Point, Polygon
+from shapely.strtree import STRtree
 
+from pyrecon import openSeries
 from pyrecon.classes import Series, Section
 from pyrecon.tools import reconstruct_writer
+from pyrecon.tools.workers import pool_map
 
 TOLERANCE = 1 + 2**-17
+# Bounding box padding covering the coordinate tolerance of almost_equals
+CONTACT_MARGIN = 1e-5
+
+# Policies for automatically resolving merge conflicts
+PREFER_A = "a"  # take the first Series' version
+PREFER_B = "b"  # take the second Series' version
+UNION = "union"  # take the first Series' version plus unique contours of the second
+POLICIES = (PREFER_A, PREFER_B, UNION)
+
+MERGE_STATE_VERSION = 1
 
 
 def get_bounding_box(shape):
@@ -109,8 +127,88 @@ def is_potential_duplicate(shape1, shape2, threshold=TOLERANCE):
         set([shape1.type, shape2.type])))
 
 
-def createMergeSet(series1, series2):  # TODO: needs multithreading
-    """Return a MergeSet from two Series."""
+def is_hash_comparable(shape):
+    """Return True if equal Contour.content_hash() means is_exact_duplicate.
+
+    Zero-area or invalid Polygons are never exact duplicates, even of
+    themselves, so they must be compared geometrically.
+    """
+    if isinstance(shape, Polygon):
+        return shape.area > 0 and shape.is_valid
+    return True
+
+
+def get_equality_key(contour):
+    """Return a hashable key, equal for Contours that are == (Contour.__eq__)."""
+    border = contour.border
+    fill = contour.fill
+    transform = contour.transform
+    return (
+        contour.name,
+        contour.closed,
+        contour.simplified,
+        contour.mode,
+        tuple(border) if border is not None else None,
+        tuple(fill) if fill is not None else None,
+        tuple(map(tuple, numpy.asarray(contour.points).tolist())),
+        transform.key() if transform is not None else None,
+    )
+
+
+class ContourIndex(object):
+    """Spatial index of Contours for finding ones that may be contacting.
+
+    Contours are indexed by the bounding boxes of their shapes in an STRtree,
+    with one tree per Contour name if <by_name> is True. Trees are built on
+    first use.
+    """
+
+    def __init__(self, contours, by_name=True):
+        self.contours = contours
+        self.by_name = by_name
+        self._groups = {}  # name (or None): positions of Contours in contours
+        for position, contour in enumerate(contours):
+            self._groups.setdefault(self._group(contour), []).append(position)
+        self._trees = {}  # name (or None): (STRtree, {id(shape): position})
+
+    def _group(self, contour):
+        return contour.name if self.by_name else None
+
+    def _tree(self, group):
+        if group not in self._trees:
+            positions = self._groups[group]
+            shapes = [self.contours[position].shape for position in positions]
+            self._trees[group] = (
+                STRtree(shapes),
+                {id(shape): position for shape, position in zip(shapes, positions)},
+            )
+        return self._trees[group]
+
+    def query(self, contour):
+        """Return Contours that may be contacting contour, in original order.
+
+        These are the Contours (with the same name if by_name) whose shape's
+        bounding box is within CONTACT_MARGIN of contour's.
+        """
+        group = self._group(contour)
+        if group not in self._groups:
+            return []
+        tree, positions = self._tree(group)
+        minx, miny, maxx, maxy = contour.shape.bounds
+        search = box(minx - CONTACT_MARGIN, miny - CONTACT_MARGIN,
+                     maxx + CONTACT_MARGIN, maxy + CONTACT_MARGIN)
+        found = sorted(positions[id(shape)] for shape in tree.query(search))
+        return [self.contours[position] for position in found]
+
+
+def createMergeSet(series1, series2, workers=None, callback=None):
+    """Return a MergeSet from two Series.
+
+    MergeSections are built by a pool of <workers> processes when <workers> is
+    greater than 1; their section1 and section2 are then copies of the Series'
+    Sections. If given, callback(completed, total) is called as each
+    MergeSection is built.
+    """
     if len(series1.sections) != len(series2.sections):
         raise Exception("Series do not have the same number of Sections.")
 
@@ -119,16 +217,69 @@ def createMergeSet(series1, series2):  # TODO: needs multithreading
         series1=series1,
         series2=series2,
     )
-    m_secs = []
-    for section1, section2 in zip(series1.sections, series2.sections):
+    section_pairs = list(zip(series1.sections, series2.sections))
+    for section1, section2 in section_pairs:
         if section1.index != section2.index:
             raise Exception("Section indices do not match.")
-        merge_section = MergeSection(
+    m_secs = pool_map(
+        _createMergeSection, section_pairs, workers=workers, callback=callback)
+
+    return MergeSet(
+        name=m_ser.name,
+        merge_series=m_ser,
+        section_merges=m_secs,
+    )
+
+
+def _createMergeSection(section_pair):
+    """Return a MergeSection from a (section1, section2) pair."""
+    section1, section2 = section_pair
+    return MergeSection(
+        name=section1.name,
+        section1=section1,
+        section2=section2,
+    )
+
+
+def loadMergeSet(path, series1=None, series2=None, verify=True):
+    """Return the MergeSet saved by MergeSet.saveState at path.
+
+    <series1> and <series2> are the merged Series, or paths to them, and
+    default to the paths saved. Conflicts are not recomputed. If <verify> is
+    True, the Series and Sections must have the contents they had when saved.
+    """
+    with gzip.open(path, "rb") as f:
+        state = json.load(f)
+    if state["version"] != MERGE_STATE_VERSION:
+        raise ValueError("Unsupported merge state version: {}".format(
+            state["version"]))
+    series1 = series1 if series1 is not None else str(state["paths"][0])
+    series2 = series2 if series2 is not None else str(state["paths"][1])
+    if isinstance(series1, basestring):
+        series1 = openSeries(series1)
+    if isinstance(series2, basestring):
+        series2 = openSeries(series2)
+    if len(series1.sections) != len(state["sections"]):
+        raise ValueError("Series do not have the saved number of Sections.")
+
+    m_ser = MergeSeries(
+        name=series1.name,
+        series1=series1,
+        series2=series2,
+        check_conflicts=False,
+    )
+    m_ser.setState(state["series"], verify=verify)
+    m_secs = []
+    for section1, section2, section_state in zip(
+            series1.sections, series2.sections, state["sections"]):
+        m_sec = MergeSection(
             name=section1.name,
             section1=section1,
             section2=section2,
+            check_conflicts=False,
         )
-        m_secs.append(merge_section)
+        m_sec.setState(section_state, verify=verify)
+        m_secs.append(m_sec)
 
     return MergeSet(
         name=m_ser.name,
@@ -137,6 +288,52 @@ def createMergeSet(series1, series2):  # TODO: needs multithreading
     )
 
 
+def _get_positions(objects1, objects2):
+    """Return {id(object): reference} for objects of two lists.
+
+    The reference of the nth object is n in <objects1> and ~n (-n - 1) in
+    <objects2>.
+    """
+    positions = {id(obj): ~position for position, obj in enumerate(objects2)}
+    positions.update(
+        (id(obj), position) for position, obj in enumerate(objects1))
+    return positions
+
+
+def _encode_objects(objects, positions):
+    """Return references (see _get_positions) of objects, or None if None."""
+    if objects is None:
+        return None
+    try:
+        return [positions[id(obj)] for obj in objects]
+    except KeyError:
+        raise ValueError("Cannot save objects not from the merged Series.")
+
+
+def _decode_objects(references, objects1, objects2):
+    """Return objects of two lists from references made by _encode_objects."""
+    if references is None:
+        return None
+    return [objects1[ref] if ref >= 0 else objects2[~ref] for ref in references]
+
+
+def _encode_attributes(attributes, attributes1, attributes2):
+    """Return 1 or 2 for attributes of the first or second object, or None."""
+    if attributes is None:
+        return None
+    elif attributes == attributes1:
+        return 1
+    elif attributes == attributes2:
+        return 2
+    raise ValueError("Cannot save attributes not from the merged Series.")
+
+
+def _check_fingerprints(state, obj1, obj2, name):
+    """Raise ValueError if obj1 and obj2 changed since <state> was saved."""
+    if state["fingerprints"] != [obj1.fingerprint(), obj2.fingerprint()]:
+        raise ValueError("{} changed since merge state was saved.".format(name))
+
+
 class MergeSet(object):
     """Class for merging data Series and Section data."""
 
@@ -153,14 +350,53 @@ class MergeSet(object):
                 break
         return (self.seriesMerge.isDone() and sections_done)
 
-    def writeMergeSet(self, outpath):  # TODO
-        """Writes self.seriesMerge and self.sectionMerges to XML"""
+    def saveState(self, path):
+        """Save categorizations and resolutions to a gzipped JSON file at path.
+
+        Contours and Images are saved as their positions in the merged
+        Series, so only resolutions chosen from them can be saved. Reload
+        with loadMergeSet.
+        """
+        state = {
+            "version": MERGE_STATE_VERSION,
+            "name": self.name,
+            "paths": [self.seriesMerge.series1.path, self.seriesMerge.series2.path],
+            "series": self.seriesMerge.getState(),
+            "sections": [merge.getState() for merge in self.sectionMerges],
+        }
+        # Write to a temporary file, then rename so a crash never loses state
+        temp_path = path + ".tmp"
+        try:
+            with gzip.open(temp_path, "wb") as f:
+                json.dump(state, f, separators=(",", ":"))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        reconstruct_writer.replace_files([(temp_path, path)])
+
+    def autoResolve(self, policy=PREFER_A):
+        """Resolve all unresolved conflicts by <policy> (one of POLICIES).
+
+        Return the names of the MergeSeries and MergeSections that had
+        conflicts.
+        """
+        merges = [self.seriesMerge] + list(self.sectionMerges)
+        return [merge.name for merge in merges if merge.autoResolve(policy)]
+
+    def writeMergeSet(self, outpath, overwrite=False, workers=None):
+        """Writes self.seriesMerge and self.sectionMerges to XML
+
+        Sections are written by a pool of <workers> processes when <workers>
+        is greater than 1.
+        """
         merged_series = self.seriesMerge.toSeries()
         merged_series.name = self.seriesMerge.name.replace(".ser", "")
         for mergeSec in self.sectionMerges:  # TODO
             merged_series.sections.append(mergeSec.toSection())
-        reconstruct_writer.write_series(merged_series, outpath, sections=True)
-        print "Done!"  # TODO
+        reconstruct_writer.write_series(
+            merged_series, outpath, sections=True, overwrite=overwrite,
+            workers=workers)
 
 
 class MergeSection(object):
@@ -184,7 +420,9 @@ class MergeSection(object):
         self.definite_shared_contours = None
         self.potential_shared_contours = None
 
-        self.checkConflicts()
+        # Skipped when categorizations are restored by setState
+        if kwargs.get("check_conflicts", True):
+            self.checkConflicts()
 
     def checkConflicts(self):  # TODO
         """Automatically sets merged stuff if they are equivalent"""
@@ -217,59 +455,160 @@ class MergeSection(object):
                 self.images is not None,
                 self.contours is not None).count(True)
 
-    def getCategorizedContours(self, threshold=(1 + 2**(-17)), sameName=True, include_overlaps=False):
-        """Returns lists of mutually overlapping contours between two Section objects."""
+    def getState(self):
+        """Return a JSON-serializable dict of categorizations and resolutions.
+
+        Contours and Images are referenced by position (see _get_positions).
+        """
+        contours = _get_positions(self.section1.contours, self.section2.contours)
+        images = _get_positions(self.section1.images, self.section2.images)
+        return {
+            "name": self.name,
+            "fingerprints": [
+                self.section1.fingerprint(), self.section2.fingerprint()],
+            "done": self.isDone(),
+            "unique": [
+                _encode_objects(self.section_1_unique_contours, contours),
+                _encode_objects(self.section_2_unique_contours, contours),
+            ],
+            "definite": _encode_objects(self.definite_shared_contours, contours),
+            "potential": [
+                _encode_objects(pair, contours)
+                for pair in self.potential_shared_contours or []],
+            "attributes": _encode_attributes(
+                self.attributes, self.section1.attributes(),
+                self.section2.attributes()),
+            "images": _encode_objects(self.images, images),
+            "contours": _encode_objects(self.contours, contours),
+        }
+
+    def setState(self, state, verify=True):
+        """Restore categorizations and resolutions from getState's dict.
+
+        If <verify> is True, raise ValueError if the Sections changed since.
+        """
+        if verify:
+            _check_fingerprints(state, self.section1, self.section2, self.name)
+        contours1 = self.section1.contours
+        contours2 = self.section2.contours
+        unique1, unique2 = state["unique"]
+        self.section_1_unique_contours = _decode_objects(
+            unique1, contours1, contours2)
+        self.section_2_unique_contours = _decode_objects(
+            unique2, contours1, contours2)
+        self.definite_shared_contours = _decode_objects(
+            state["definite"], contours1, contours2)
+        self.potential_shared_contours = [
+            _decode_objects(pair, contours1, contours2)
+            for pair in state["potential"]]
+        self.attributes = None
+        if state["attributes"] == 1:
+            self.attributes = self.section1.attributes()
+        elif state["attributes"] == 2:
+            self.attributes = self.section2.attributes()
+        self.images = _decode_objects(
+            state["images"], self.section1.images, self.section2.images)
+        self.contours = _decode_objects(state["contours"], contours1, contours2)
+
+    def autoResolve(self, policy=PREFER_A):
+        """Resolve unresolved (None) merged stuff by <policy>.
+
+        PREFER_A and PREFER_B take the section1 or section2 version. UNION
+        takes section1's attributes and images, and section1's contours plus
+        the contours unique to section2. Return True if anything was resolved.
+        """
+        if policy not in POLICIES:
+            raise ValueError("Unknown merge policy: {}".format(policy))
+        if self.isDone():
+            return False
+        preferred = self.section2 if policy == PREFER_B else self.section1
+        if self.attributes is None:
+            self.attributes = preferred.attributes()
+        if self.images is None:
+            self.images = preferred.images
+        if self.contours is None:
+            if policy == UNION:
+                self.contours = (
+                    list(self.section1.contours) + self.section_2_unique_contours)
+            else:
+                self.contours = preferred.contours
+        return True
+
+    def getCategorizedContours(self, threshold=(1 + 2**(-17)), sameName=True, include_overlaps=False, use_hashes=True):
+        """Returns lists of mutually overlapping contours between two Section objects.
+
+        If <use_hashes> is True, pairs with equal Contour.content_hash() are
+        exact duplicates without being compared geometrically, where
+        is_hash_comparable.
+        """
         complete_overlaps = []
         potential_overlaps = []
 
-        # Compute overlaps
-        sec1_overlaps = []  # Section1 contours that have ovlps in section2
-        sec2_overlaps = []  # Section2 contours that have ovlps in section1
+        # Compute overlaps, tracking Contours by id() to avoid slow __eq__
+        sec1_overlaps = set()  # Section1 contours that have ovlps in section2
+        sec2_overlaps = set()  # Section2 contours that have ovlps in section1
+        # Only Contours with intersecting bounding boxes can be contacting
+        section2_index = ContourIndex(self.section2.contours, by_name=sameName)
+        # id(Contour): content hash (None if not is_hash_comparable), computed
+        # only for Contours with candidates, as their shapes are needed anyway
+        hashes = {}
+
+        def get_hash(contour):
+            if id(contour) not in hashes:
+                hashes[id(contour)] = (
+                    contour.content_hash()
+                    if is_hash_comparable(contour.shape) else None)
+            return hashes[id(contour)]
+
         for contA in self.section1.contours:
-            ovlpA = []
-            ovlpB = []
-            for contB in self.section2.contours:
-                if sameName and contA.name != contB.name:
-                    continue
-                if contA.shape.type != contB.shape.type:
+            candidates = section2_index.query(contA)
+            hashA = get_hash(contA) if use_hashes and candidates else None
+            for contB in candidates:
+                if hashA is not None and get_hash(contB) == hashA:
+                    exact = True
+                elif contA.shape.type != contB.shape.type:
                     # Ignore contours with different shapes
                     continue
-
-                if not is_contacting(contA.shape, contB.shape):
+                elif not is_contacting(contA.shape, contB.shape):
                     continue
-                elif is_exact_duplicate(contA.shape, contB.shape):
-                    ovlpA.append(contA)
-                    ovlpB.append(contB)
+                else:
+                    exact = is_exact_duplicate(contA.shape, contB.shape)
+
+                if exact:
                     complete_overlaps.append(contA)
-                    continue
-                if is_potential_duplicate(contA.shape, contB.shape):
-                    ovlpA.append(contA)
-                    ovlpB.append(contB)
+                elif is_potential_duplicate(contA.shape, contB.shape):
                     potential_overlaps.append([contA, contB])
-            sec1_overlaps.extend(ovlpA)
-            sec2_overlaps.extend(ovlpB)
+                else:
+                    continue
+                sec1_overlaps.add(id(contA))
+                sec2_overlaps.add(id(contB))
 
+        section_1_unique_contours = [
+            cont for cont in self.section1.contours if id(cont) not in sec1_overlaps]
+        section_2_unique_contours = [
+            cont for cont in self.section2.contours if id(cont) not in sec2_overlaps]
         if include_overlaps:
             # Return unique conts from section1, unique conts from section2,
             # completely overlapping contours, and incompletely overlapping
-            # contours
-            new_potential_overlaps = []
-            for contA, contB in potential_overlaps:
-                if contA in complete_overlaps and contB in complete_overlaps:
-                    continue
-                else:
-                    new_potential_overlaps.append([contA, contB])
-            potential_overlaps = new_potential_overlaps
+            # contours (unless both equal completely overlapping contours)
+            if potential_overlaps:
+                complete_keys = set(
+                    get_equality_key(cont) for cont in complete_overlaps)
+                potential_overlaps = [
+                    [contA, contB] for contA, contB in potential_overlaps
+                    if not (get_equality_key(contA) in complete_keys and
+                            get_equality_key(contB) in complete_keys)
+                ]
             return (
-                [cont for cont in self.section1.contours if cont not in sec1_overlaps],
-                [cont for cont in self.section2.contours if cont not in sec2_overlaps],
+                section_1_unique_contours,
+                section_2_unique_contours,
                 complete_overlaps,
                 potential_overlaps
             )
         else:
             return (
-                [cont for cont in self.section1.contours if cont not in sec1_overlaps],
-                [cont for cont in self.section2.contours if cont not in sec2_overlaps]
+                section_1_unique_contours,
+                section_2_unique_contours
             )
 
     def toSection(self):
@@ -280,7 +619,10 @@ class MergeSection(object):
         attributes = self.attributes if self.attributes is not None else self.section1.attributes()
         images = self.images if self.images is not None else self.section1.images
         contours = self.contours if self.contours is not None else self.section1.contours
-        return Section(images=images, contours=contours, **attributes)
+        # Clean (so not rewritten) if unchanged from section1's file
+        return Section(
+            images=images, contours=contours, _path=self.section1._path,
+            _clean_fingerprint=self.section1._clean_fingerprint, **attributes)
 
 
 class MergeSeries(object):
@@ -298,7 +640,8 @@ class MergeSeries(object):
         self.contours = None
         self.zcontours = None
 
-        self.checkConflicts()
+        if kwargs.get("check_conflicts", True):
+            self.checkConflicts()
 
     def checkConflicts(self):
         """Automatically set merged stuff for equivalent things."""
@@ -324,20 +667,100 @@ class MergeSeries(object):
                 self.contours is not None,
                 self.zcontours is not None).count(True)
 
+    def getState(self):
+        """Return a JSON-serializable dict of resolutions.
+
+        Contours and ZContours are referenced by position (see _get_positions).
+        """
+        return {
+            "name": self.name,
+            "fingerprints": [
+                self.series1.fingerprint(), self.series2.fingerprint()],
+            "done": self.isDone(),
+            "attributes": _encode_attributes(
+                self.attributes, self.series1.attributes(),
+                self.series2.attributes()),
+            "contours": _encode_objects(self.contours, _get_positions(
+                self.series1.contours, self.series2.contours)),
+            "zcontours": _encode_objects(self.zcontours, _get_positions(
+                self.series1.zcontours, self.series2.zcontours)),
+        }
+
+    def setState(self, state, verify=True):
+        """Restore resolutions from getState's dict.
+
+        If <verify> is True, raise ValueError if the Series changed since.
+        """
+        if verify:
+            _check_fingerprints(state, self.series1, self.series2, self.name)
+        self.attributes = None
+        if state["attributes"] == 1:
+            self.attributes = self.series1.attributes()
+        elif state["attributes"] == 2:
+            self.attributes = self.series2.attributes()
+        self.contours = _decode_objects(
+            state["contours"], self.series1.contours, self.series2.contours)
+        self.zcontours = _decode_objects(
+            state["zcontours"], self.series1.zcontours, self.series2.zcontours)
+
+    def autoResolve(self, policy=PREFER_A):
+        """Resolve unresolved (None) merged stuff by <policy>.
+
+        PREFER_A and PREFER_B take the series1 or series2 version. UNION takes
+        series1's attributes, and series1's contours and zcontours plus those
+        unique to series2. Return True if anything was resolved.
+        """
+        if policy not in POLICIES:
+            raise ValueError("Unknown merge policy: {}".format(policy))
+        if self.isDone():
+            return False
+        preferred = self.series2 if policy == PREFER_B else self.series1
+        if self.attributes is None:
+            self.attributes = preferred.attributes()
+        if self.contours is None:
+            if policy == UNION:
+                self.contours = list(self.series1.contours) + [
+                    contour for contour in self.series2.contours
+                    if contour not in self.series1.contours]
+            else:
+                self.contours = preferred.contours
+        if self.zcontours is None:
+            if policy == UNION:
+                self.zcontours = (
+                    list(self.series1.zcontours) +
+                    self.getCategorizedZContours()[1])
+            else:
+                self.zcontours = preferred.zcontours
+        return True
+
     def getCategorizedZContours(self, threshold=(1 + 2**(-17))):
         """Return unique Series1 ZContours, unique Series2 ZContours,
         and overlapping Contours to be merged."""
-        copy_contours_1 = [cont for cont in self.series1.zcontours]
-        copy_contours_2 = [cont for cont in self.series2.zcontours]
+        # Series2 ZContours by name
+        zcontours_2 = {}
+        for position, contB in enumerate(self.series2.zcontours):
+            zcontours_2.setdefault(contB.name, []).append(position)
+        matched_1 = set()  # positions in series1.zcontours
+        matched_2 = set()  # positions in series2.zcontours
         overlapping_zcontours = []
-        for contA in copy_contours_1:
-            for contB in copy_contours_2:
-                if contA.name == contB.name and is_exact_duplicate(contA.shape, contB.shape):
-                    # If overlaps, append to overlap list and remove from unique lists
+        for positionA, contA in enumerate(self.series1.zcontours):
+            for positionB in zcontours_2.get(contA.name, []):
+                if positionB in matched_2:
+                    continue
+                contB = self.series2.zcontours[positionB]
+                if is_exact_duplicate(contA.shape, contB.shape):
+                    # Each ZContour overlaps at most one ZContour of the other Series
                     overlapping_zcontours.append(contA)
-                    copy_contours_1.remove(contA)
-                    copy_contours_2.remove(contB)
-        return copy_contours_1, copy_contours_2, overlapping_zcontours
+                    matched_1.add(positionA)
+                    matched_2.add(positionB)
+                    break
+        return (
+            [cont for position, cont in enumerate(self.series1.zcontours)
+             if position not in matched_1],
+            [cont for position, cont in enumerate(self.series2.zcontours)
+             if position not in matched_2],
+            overlapping_zcontours,
+        )
 
     def toSeries(self):
         """Return a Series object that resolves the merge.
@@ -347,4 +770,7 @@ class MergeSeries(object):
         attributes = self.attributes if self.attributes is not None else self.series1.attributes()
         contours = self.contours if self.contours is not None else self.series1.contours
         zcontours = self.zcontours if self.zcontours is not None else self.series1.zcontours
-        return Series(contours=contours, zcontours=zcontours, **attributes)
+        # Clean (so not rewritten) if unchanged from series1's file
+        return Series(
+            contours=contours, zcontours=zcontours, path=self.series1.path,
+            _clean_fingerprint=self.series1._clean_fingerprint, **attributes)
@@ -0,0 +1,129 @@
+"""Functions for storing all points of a Series in one memory-mapped array.
+
+A point store is a directory holding:
+    points.f8: every Section Contour's points as one raw little-endian
+               float64 array of shape (N, 2)
+    offsets.npy: one (section, ordinal, start, stop) row per Contour, in
+                 Section index order, where <ordinal> is the Contour's
+                 position in Section.contours and start:stop are its rows of
+                 points.f8
+
+Stores are opened read-only, so any number of processes can share the pages
+of one mapping.
+"""
+import os
+
+import numpy
+
+from pyrecon.classes.points import Points
+from pyrecon.tools.reconstruct_reader import iter_series_contours
+
+POINTS_FILENAME = "points.f8"
+OFFSETS_FILENAME = "offsets.npy"
+
+POINTS_DTYPE = numpy.dtype("<f8")
+OFFSETS_DTYPE = numpy.dtype([
+    ("section", numpy.int32),
+    ("ordinal", numpy.int32),
+    ("start", numpy.int64),
+    ("stop", numpy.int64),
+])
+
+
+def export_point_store(series, path):
+    """Write the points of <series> to a point store directory at path.
+
+    <series> is a Series, or the path to a Series directory, whose Sections
+    are then streamed so the Series is never fully in memory. Return the
+    number of points written.
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    if isinstance(series, basestring):
+        contours = iter_series_contours(series)
+    else:
+        contours = (
+            (section.index, contour)
+            for section in sorted(series.sections, key=lambda s: s.index)
+            for contour in section.contours
+        )
+
+    offsets = []
+    start = 0
+    previous_section = None
+    with open(os.path.join(path, POINTS_FILENAME), "wb") as f:
+        for section_index, contour in contours:
+            if section_index != previous_section:
+                ordinal = 0
+                previous_section = section_index
+            points = numpy.ascontiguousarray(contour.points, dtype=POINTS_DTYPE)
+            points = points.reshape((-1, 2))
+            f.write(points.tostring())
+            offsets.append((section_index, ordinal, start, start + len(points)))
+            start += len(points)
+            ordinal += 1
+    numpy.save(
+        os.path.join(path, OFFSETS_FILENAME),
+        numpy.array(offsets, dtype=OFFSETS_DTYPE))
+    return start
+
+
+class PointStore(object):
+    """Read-only view of a point store directory written by export_point_store.
+
+    Points are returned as zero-copy Points views of the memory-mapped array.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = numpy.load(os.path.join(path, OFFSETS_FILENAME))
+        count = int(self.offsets["stop"][-1]) if len(self.offsets) else 0
+        if count:
+            self.points = numpy.memmap(
+                os.path.join(path, POINTS_FILENAME), dtype=POINTS_DTYPE,
+                mode="r", shape=(count, 2))
+        else:
+            # Empty files cannot be memory-mapped
+            self.points = numpy.zeros((0, 2), dtype=POINTS_DTYPE)
+
+        # Section index: (first row of offsets, number of Contours)
+        self._sections = {}
+        for row, section_index in enumerate(self.offsets["section"].tolist()):
+            first, contours = self._sections.get(section_index, (row, 0))
+            self._sections[section_index] = (first, contours + 1)
+
+    def __len__(self):
+        """Return number of Contours in the store."""
+        return len(self.offsets)
+
+    def sections(self):
+        """Return a sorted list of the Section indices in the store."""
+        return sorted(self._sections)
+
+    def contour_count(self, section_index):
+        """Return the number of Contours stored for Section <section_index>."""
+        return self._sections.get(section_index, (0, 0))[1]
+
+    def get(self, section_index, ordinal):
+        """Return points of the <ordinal>th Contour of Section <section_index>."""
+        first, contours = self._sections.get(section_index, (0, 0))
+        if not 0 <= ordinal < contours:
+            raise KeyError(
+                "No Contour {} in Section {}".format(ordinal, section_index))
+        _, _, start, stop = self.offsets[first + ordinal]
+        return self.points[start:stop].view(Points)
+
+    def attach(self, series):
+        """Replace the points of each Contour in <series> with store views.
+
+        The Sections of <series> must have the Contours the store was
+        exported from, in the same order.
+        """
+        for section in series.sections:
+            if len(section.contours) != self.contour_count(section.index):
+                raise ValueError(
+                    "Section {} has {} Contours, store has {}".format(
+                        section.index, len(section.contours),
+                        self.contour_count(section.index)))
+            for ordinal, contour in enumerate(section.contours):
+                contour.points = self.get(section.index, ordinal)
@@ -1,12 +1,23 @@
 """Functions for creating Python objects from RECONSTRUCT XML files."""
+import fnmatch
+import mmap
 import re
 import os
+from collections import OrderedDict
+from functools import partial
 
+import numpy
 from lxml import etree
 
 from pyrecon.classes import (
     Contour, Image, Section, Series, Transform, ZContour
 )
+from pyrecon.classes.compact import (
+    CompactContour, CompactImage, CompactSection, CompactTransform,
+    CompactZContour
+)
+from pyrecon.classes.points import to_points
+from pyrecon.tools.workers import pool_map
 
 
 def str_to_bool(string):
@@ -14,33 +25,233 @@ def str_to_bool(string):
     return string.capitalize() == "True"
 
 
-def process_series_directory(path):
-    """Return a Series, fully loaded with data found in the provided path."""
+def process_series_directory(path, workers=None, threads=False, lazy=False,
+                             cache_size=64, compact=False, cache=False,
+                             cache_dir=None, track_changes=False):
+    """Return a Series, fully loaded with data found in the provided path.
+
+    Section files are parsed by a pool of <workers> processes (or threads if
+    <threads> is True) when <workers> is greater than 1. If <lazy> is True,
+    Series.sections is a LazySections that parses each Section on first access
+    and keeps at most <cache_size> of them in memory. If <compact> is True,
+    objects are built from pyrecon.classes.compact classes.
+
+    If <cache> is True, Sections are loaded from binary caches (in <cache_dir>
+    if given, else next to the Section files) when they are up to date, and
+    cached after parsing otherwise. See pyrecon.tools.section_cache.
+
+    If <track_changes> is True, the Series and Sections are marked clean as
+    they are loaded, so is_dirty() reports changes made since. Otherwise they
+    are always dirty, which spares fingerprinting every loaded object.
+    """
     # Gather Series from provided path
-    series_files = []
-    for filename in os.listdir(path):
-        if ".ser" in filename:
-            series_files.append(filename)
-    assert len(series_files) == 1, "There is more than one Series file in the provided directory"
-    series_file = series_files[0]
-    series_path = os.path.join(path, series_file)
-    series = process_series_file(series_path)
+    series_path = get_series_path(path)
+    series_stats = get_file_stats(series_path)
+    series = process_series_file(
+        series_path, compact=compact, track_changes=track_changes)
+    series._file_stats[series_path] = series_stats
+    series._load_options = {
+        "compact": compact, "cache": cache, "cache_dir": cache_dir,
+        "track_changes": track_changes}
 
     # Gather Sections from provided path
-    section_regex = re.compile(r"{}.[0-9]+$".format(series.name))
-    sections = []
-    for filename in os.listdir(path):
-        if re.match(section_regex, filename):
-            section_path = os.path.join(path, filename)
-            section = process_section_file(section_path)
-            sections.append(section)
+    section_paths = get_section_paths(path, series.name)
+    for section_path in section_paths:
+        series._file_stats[section_path] = get_file_stats(section_path)
+    if lazy:
+        series.sections = LazySections(
+            section_paths, cache_size=cache_size, compact=compact,
+            cache=cache, cache_dir=cache_dir, track_changes=track_changes)
+        return series
+    sections = pool_map(
+        partial(load_section_file, **series._load_options),
+        section_paths, workers=workers, threads=threads)
     series.sections = sorted(sections, key=lambda Section: Section.index)
 
     return series
 
 
-def process_series_file(path):
-    """Return a Series object from Series XML file."""
+def get_file_stats(path):
+    """Return (size, mtime) of the file at path, for detecting changes."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime
+
+
+def refresh_series(series, workers=None, threads=False):
+    """Reload the files of <series> that changed since it was loaded.
+
+    Only the Series file and Section files whose size or mtime changed, or
+    that were added or removed, are parsed (with <workers> and <threads> as
+    in process_series_directory). Return a dict of what was reloaded:
+        "series": True if the Series file changed
+        "changed", "added", "removed": sorted lists of Section indices
+    """
+    if series.path is None:
+        raise Exception("Series was not loaded from a directory.")
+    options = series._load_options
+    old_stats = series._file_stats
+    new_stats = {}
+    report = {"series": False, "changed": [], "added": [], "removed": []}
+
+    series_path = get_series_path(series.path)
+    new_stats[series_path] = get_file_stats(series_path)
+    if old_stats.get(series_path) != new_stats[series_path]:
+        report["series"] = True
+        reloaded = process_series_file(
+            series_path, compact=options["compact"],
+            track_changes=options["track_changes"])
+        series.__dict__.update(reloaded.attributes())
+        series.contours = reloaded.contours
+        series.zcontours = reloaded.zcontours
+        series._clean_fingerprint = reloaded._clean_fingerprint
+
+    old_paths = set(path for path in old_stats if path != series_path)
+    reload_paths = []
+    for section_path in get_section_paths(series.path, series.name):
+        new_stats[section_path] = get_file_stats(section_path)
+        if section_path not in old_paths:
+            report["added"].append(get_section_index(section_path))
+            reload_paths.append(section_path)
+        elif old_stats[section_path] != new_stats[section_path]:
+            report["changed"].append(get_section_index(section_path))
+            reload_paths.append(section_path)
+    removed_paths = old_paths.difference(new_stats)
+    report["removed"] = [get_section_index(path) for path in removed_paths]
+    for key in ("changed", "added", "removed"):
+        report[key].sort()
+
+    if isinstance(series.sections, LazySections):
+        series.sections.refresh(
+            [path for path in new_stats if path != series_path],
+            reload_paths + list(removed_paths))
+    elif reload_paths or removed_paths:
+        stale = set(reload_paths).union(removed_paths)
+        sections = [
+            section for section in series.sections
+            if os.path.join(section._path, section.name) not in stale
+        ]
+        sections.extend(pool_map(
+            partial(load_section_file, **options), reload_paths,
+            workers=workers, threads=threads))
+        # Keep the same list, in case it is referenced elsewhere
+        series.sections[:] = sorted(sections, key=lambda Section: Section.index)
+
+    series._file_stats = new_stats
+    return report
+
+
+def get_section_paths(path, series_name):
+    """Return paths to the Section files of Series <series_name> in path."""
+    section_regex = re.compile(r"{}.[0-9]+$".format(series_name))
+    section_paths = []
+    for filename in os.listdir(path):
+        if re.match(section_regex, filename):
+            section_paths.append(os.path.join(path, filename))
+    return section_paths
+
+
+def load_section_file(path, compact=False, cache=False, cache_dir=None,
+                      track_changes=False):
+    """Return a Section from the Section file at path, using the cache if <cache>."""
+    if cache:
+        from pyrecon.tools.section_cache import process_section_file_cached
+        return process_section_file_cached(
+            path, compact=compact, cache_dir=cache_dir,
+            track_changes=track_changes)
+    return process_section_file(
+        path, compact=compact, track_changes=track_changes)
+
+
+def get_section_index(path):
+    """Return the Section index from a Section file's extension."""
+    return int(path.rsplit(".", 1)[-1])
+
+
+class LazySections(object):
+    """Sequence of Sections that are parsed from their files on first access.
+
+    Parsed Sections are kept in a least-recently-used cache of <cache_size>
+    Sections (unbounded if None). An evicted Section is parsed again when next
+    accessed, so unsaved changes to it are lost. <cache>, <cache_dir> and
+    <track_changes> are as in process_series_directory.
+    """
+
+    def __init__(self, paths, cache_size=64, compact=False, cache=False,
+                 cache_dir=None, track_changes=False):
+        self.paths = sorted(paths, key=get_section_index)
+        self.indices = [get_section_index(path) for path in self.paths]
+        self.cache_size = cache_size
+        self.compact = compact
+        self.cache = cache
+        self.cache_dir = cache_dir
+        self.track_changes = track_changes
+        self._cache = OrderedDict()  # path: Section, oldest first
+
+    def __len__(self):
+        """Return number of Section files."""
+        return len(self.paths)
+
+    def __getitem__(self, position):
+        """Return the Section (or list of Sections) at position."""
+        if isinstance(position, slice):
+            return [self._load(path) for path in self.paths[position]]
+        return self._load(self.paths[position])
+
+    def __iter__(self):
+        """Iterate over Sections in index order, parsing them as needed."""
+        for path in self.paths:
+            yield self._load(path)
+
+    def refresh(self, paths, stale_paths):
+        """Use Section files at <paths>, reparsing any in <stale_paths>."""
+        self.paths = sorted(paths, key=get_section_index)
+        self.indices = [get_section_index(path) for path in self.paths]
+        for path in stale_paths:
+            self._cache.pop(path, None)
+
+    def loaded(self):
+        """Return a list of the Sections currently in memory, in index order.
+
+        Sections not in memory are as in their files.
+        """
+        return [self._cache[path] for path in self.paths if path in self._cache]
+
+    def get(self, index):
+        """Return the Section with the given Section index."""
+        try:
+            position = self.indices.index(index)
+        except ValueError:
+            raise KeyError("No Section with index {}".format(index))
+        return self._load(self.paths[position])
+
+    def _load(self, path):
+        """Return Section at path, from cache if possible."""
+        section = self._cache.pop(path, None)
+        if section is None:
+            section = load_section_file(
+                path, compact=self.compact, cache=self.cache,
+                cache_dir=self.cache_dir, track_changes=self.track_changes)
+        self._cache[path] = section
+        if self.cache_size is not None:
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return section
+
+
+def get_classes(compact=False):
+    """Return the (Contour, Image, Section, Transform, ZContour) classes to build."""
+    if compact:
+        return (CompactContour, CompactImage, CompactSection, CompactTransform,
+                CompactZContour)
+    return Contour, Image, Section, Transform, ZContour
+
+
+def process_series_file(path, compact=False, track_changes=False):
+    """Return a Series object from Series XML file.
+
+    If <track_changes> is True, the Series is marked clean.
+    """
+    contour_class, _, _, _, zcontour_class = get_classes(compact)
     tree = etree.parse(path)
     root = tree.getroot()
 
@@ -55,19 +266,26 @@ def process_series_file(path):
         if elem.tag == "Contour":
             # TODO: no Contour import
             contour_data = extract_series_contour_attributes(elem)
-            contour = Contour(**contour_data)
+            contour = contour_class(**contour_data)
             series.contours.append(contour)
         elif elem.tag == "ZContour":
             # TODO: no ZContour import
             zcontour_data = extract_zcontour_attributes(elem)  # TODO
-            zcontour = ZContour(**zcontour_data)
+            zcontour = zcontour_class(**zcontour_data)
             series.zcontours.append(zcontour)
 
+    if track_changes:
+        series.mark_clean()
     return series
 
 
-def process_section_file(path):
-    """Return a Section object from a Section XML file."""
+def process_section_file(path, compact=False, track_changes=False):
+    """Return a Section object from a Section XML file.
+
+    If <track_changes> is True, the Section is marked clean.
+    """
+    (contour_class, image_class, section_class, transform_class,
+     _) = get_classes(compact)
     tree = etree.parse(path)
     root = tree.getroot()
 
@@ -75,13 +293,13 @@ def process_section_file(path):
     data = extract_section_attributes(root)
     data["name"] = os.path.basename(path)
     data["_path"] = os.path.dirname(path)
-    section = Section(**data)
+    section = section_class(**data)
 
     # Process Images, Contours, Transforms
     for node in root:
         # make Transform object
         transform_data = extract_transform_attributes(node)
-        transform = Transform(**transform_data)
+        transform = transform_class(**transform_data)
         children = [child for child in node]
 
         # Image node
@@ -105,7 +323,7 @@ def process_section_file(path):
                     image_contours[0])
                 image_data.update(image_contour_data)
 
-            image = Image(**image_data)
+            image = image_class(**image_data)
             section.images.append(image)
 
         # Non-Image Node
@@ -114,12 +332,174 @@ def process_section_file(path):
                 if child.tag == "Contour":
                     contour_data = extract_section_contour_attributes(child)
                     contour_data["transform"] = transform
-                    contour = Contour(**contour_data)
+                    contour = contour_class(**contour_data)
                     section.contours.append(contour)
 
+    if track_changes:
+        section.mark_clean()
     return section
 
 
+def iter_section_file(path, compact=False, contour_filter=None):
+    """Yield objects from a Section XML file as their elements are parsed.
+
+    The Section (with no Images or Contours) is yielded first, then each
+    Transform followed by its Image or Contours. Parsed elements are cleared,
+    so memory use does not grow with the size of the file. The same errors as
+    process_section_file are raised, but only once iteration reaches them.
+
+    If given, contour_filter(attributes) is called with the attribute strings
+    of each non-Image Contour element, and Contours for which it returns False
+    are skipped without being created.
+    """
+    (contour_class, image_class, section_class, transform_class,
+     _) = get_classes(compact)
+
+    def make_contours(attributes, transform):
+        """Return a list of the Contour for <attributes>, if not filtered out."""
+        if contour_filter is not None and not contour_filter(attributes):
+            return []
+        contour_data = extract_section_contour_attributes(attributes)
+        contour_data["transform"] = transform
+        return [contour_class(**contour_data)]
+
+    section = None
+    depth = 0  # 1: Section, 2: Transform, 3: Image or Contour
+    for event, elem in etree.iterparse(
+            path, events=("start", "end"), huge_tree=True):
+        if event == "start":
+            depth += 1
+            if depth == 1:
+                # Create Section and populate with metadata
+                data = extract_section_attributes(elem)
+                data["name"] = os.path.basename(path)
+                data["_path"] = os.path.dirname(path)
+                section = section_class(**data)
+                yield section
+            elif depth == 2:
+                transform = transform_class(**extract_transform_attributes(elem))
+                image_data = None
+                held = None  # first Contour's attributes, in case of an Image
+                contour_count = 0
+                yield transform
+            continue
+        depth -= 1
+
+        if depth == 2 and elem.tag == "Image":
+            if image_data is not None:
+                raise Exception("No support for Sections with more than one Image.")
+            if contour_count > 1:
+                raise Exception("No support for Images with more than one Contour.")
+            image_data = extract_image_attributes(elem)
+            image_data["_path"] = section._path
+            image_data["transform"] = transform
+        elif depth == 2 and elem.tag == "Contour":
+            contour_count += 1
+            if contour_count == 1:
+                held = dict(elem.attrib)
+            elif image_data is not None:
+                raise Exception("No support for Images with more than one Contour.")
+            else:
+                # Not an Image Contour, so no need to hold any back
+                if held is not None:
+                    for contour in make_contours(held, transform):
+                        yield contour
+                    held = None
+                for contour in make_contours(elem.attrib, transform):
+                    yield contour
+        elif depth == 1:
+            if image_data is not None:
+                if held is None:
+                    raise Exception("No support for Images with out a Contour.")
+                image_data.update(extract_section_contour_attributes(held))
+                yield image_class(**image_data)
+            elif held is not None:
+                for contour in make_contours(held, transform):
+                    yield contour
+        if depth:
+            # Free parsed elements
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+
+def iter_series_contours(path, name=None, indices=None, hidden=None,
+                         closed=None, compact=False):
+    """Yield (Section index, Contour) for Contours in a Series directory.
+
+    Sections are streamed one at a time in index order, so the whole Series is
+    never in memory. Only Contours matching all given filters are created:
+        <name>: a glob pattern (e.g. "d1*") or a compiled regex to match
+        <indices>: a container of Section indices (e.g. xrange(10, 20))
+        <hidden>, <closed>: the required Contour flags
+    Section files outside of <indices>, or that cannot contain a Contour
+    named <name>, are not parsed at all.
+    """
+    contour_class = get_classes(compact)[0]
+    series_path = get_series_path(path)
+    series_name = os.path.basename(series_path).replace(".ser", "")
+    section_paths = sorted(
+        get_section_paths(path, series_name), key=get_section_index)
+    if indices is not None:
+        section_paths = [section_path for section_path in section_paths
+                         if get_section_index(section_path) in indices]
+
+    name_regex = None
+    literal = None  # exact Contour name, to check for before parsing
+    if name is not None:
+        if hasattr(name, "match"):
+            name_regex = name
+        else:
+            name_regex = re.compile(fnmatch.translate(name))
+            # Names XML may escape (or write as character references) can
+            # appear in a file in more than one way
+            if (all(" " <= char <= "~" for char in name) and
+                    not any(char in name for char in "*?[\"'&<>")):
+                literal = str(name)
+
+    def contour_filter(attributes):
+        """Return True if Contour element attributes match the filters."""
+        if name_regex is not None and not name_regex.match(attributes.get("name")):
+            return False
+        if hidden is not None and str_to_bool(attributes.get("hidden")) != hidden:
+            return False
+        if closed is not None and str_to_bool(attributes.get("closed")) != closed:
+            return False
+        return True
+
+    for section_path in section_paths:
+        if literal is not None and not file_contains(section_path, literal):
+            continue
+        section = None
+        for obj in iter_section_file(
+                section_path, compact=compact, contour_filter=contour_filter):
+            if section is None:
+                section = obj
+            elif isinstance(obj, contour_class):
+                yield section.index, obj
+
+
+def get_series_path(path):
+    """Return the path to the one Series file in directory <path>."""
+    series_files = []
+    for filename in os.listdir(path):
+        if ".ser" in filename:
+            series_files.append(filename)
+    assert len(series_files) == 1, "There is more than one Series file in the provided directory"
+    return os.path.join(path, series_files[0])
+
+
+def file_contains(path, text):
+    """Return True if the file at <path> contains the string <text>."""
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return False
+        contents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return contents.find(text) != -1
+        finally:
+            contents.close()
+
 
 def _get_points_int(points):
     return zip(
@@ -135,6 +515,24 @@ def _get_points_float(points):
     )
 
 
+def get_points_array(points, width=2):
+    """Return a points attribute string as an (N, width) float64 array.
+
+    The whole string is parsed by NumPy in a single pass, so no Python objects
+    are created per coordinate.
+    """
+    array = numpy.fromstring(
+        points.replace(",", " "), dtype=numpy.float64, sep=" ")
+    # Each point is followed by a comma, except possibly the last
+    stripped = points.rstrip()
+    expected = stripped.count(",")
+    if stripped and not stripped.endswith(","):
+        expected += 1
+    if array.size != expected * width:
+        raise ValueError("Malformed points: {}".format(points))
+    return array.reshape((-1, width))
+
+
 def extract_series_contour_attributes(node):
     """Return a dict of Series' Contour's attributes."""
     attributes = {
@@ -145,11 +543,8 @@ def extract_series_contour_attributes(node):
         "fill": tuple(float(x) for x in node.get("fill").strip().split(" ")),
     }
 
-    try:
-        attributes["points"] = _get_points_int(node.get("points"))
-    except ValueError:
-        # series contour points can be ints or floats
-        attributes["points"] = _get_points_float(node.get("points"))
+    # Series Contour points are written as ints, but parsed as floats like all points
+    attributes["points"] = to_points(get_points_array(node.get("points")))
     return attributes
 
 
@@ -164,7 +559,7 @@ def extract_section_contour_attributes(node):
         "mode": int(node.get("mode")),
         "border": tuple(float(x) for x in node.get("border").strip().split(" ")),
         "fill": tuple(float(x) for x in node.get("fill").strip().split(" ")),
-        "points": _get_points_float(node.get("points")),
+        "points": to_points(get_points_array(node.get("points"))),
     }
     return attributes
 
@@ -309,6 +704,6 @@ def extract_zcontour_attributes(node):
         "border": tuple(float(x) for x in node.get("border").split(" ")),
         "fill": tuple(float(x) for x in node.get("fill").split(" ")),
         "mode": int(node.get("mode")),
-        "points": [(float(x.split(" ")[0]), float(x.split(" ")[1]), int(x.split(" ")[2])) for x in [x.strip() for x in node.get("points").split(",")] if len(tuple(float(x) for x in x.split(" ") if x != "")) == 3],
+        "points": to_points(get_points_array(node.get("points"), width=3)),
     }
     return attributes
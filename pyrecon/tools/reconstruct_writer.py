@@ -1,11 +1,54 @@
 """Functions for writing to RECONSTRUCT XML files."""
 import os
+import re
+import shutil
+import tempfile
+from collections import OrderedDict
+from functools import partial
 
+import numpy
 from lxml import etree
 
 from pyrecon.classes import (
     Contour, Image, Section, Series, Transform, ZContour
 )
+from pyrecon.tools.reconstruct_reader import LazySections
+from pyrecon.tools.workers import pool_map
+
+POINTS_SEPARATOR = ",     "
+FSYNC_BATCH_SIZE = 64
+PREVIOUS_DIRNAME = ".previous"
+TEMP_PREFIX = ".pyrecon-write-"
+# Coordinate formats for format_points
+STR_FLOAT = "%.12g\0"  # as str(float(x)), once format_points adds any ".0"
+STR_INT = "%d"  # as str(int(x))
+# str(float) changes formatted numbers that would otherwise look like integers
+_NEEDS_DOT_ZERO = re.compile(r"(?<![^ ])-?[0-9]+\0")
+
+
+def _str_float_integer(match):
+    """Return str(float) of a "%.12g"-formatted integer, e.g. "2" -> "2.0"."""
+    digits = match.group().rstrip("\0")
+    if len(digits.lstrip("-")) < 12:
+        return digits + ".0"
+    # No room for ".0" within 12 significant digits, so str uses an exponent
+    mantissa, exponent = ("%.11e" % float(digits)).split("e")
+    return mantissa.rstrip("0").rstrip(".") + "e" + exponent
+
+
+def format_points(points, row_format):
+    """Return <points> as a RECONSTRUCT points attribute string.
+
+    Each point is formatted with <row_format> (built from STR_FLOAT, STR_INT or
+    %-formats) and followed by POINTS_SEPARATOR. All points are formatted in a
+    single string operation, rather than point by point.
+    """
+    points = numpy.asarray(points, dtype=numpy.float64)
+    text = ((row_format + POINTS_SEPARATOR) * len(points)) % tuple(
+        points.ravel().tolist())
+    if STR_FLOAT in row_format:
+        text = _NEEDS_DOT_ZERO.sub(_str_float_integer, text).replace("\0", "")
+    return text or POINTS_SEPARATOR
 
 
 def image_to_contour_xml(image):
@@ -18,7 +61,7 @@ def image_to_contour_xml(image):
         border=" ".join(map(str, map(int, image.border))),
         fill=" ".join(map(str, map(int, image.fill))),
         mode=str(image.mode),
-        points=",     ".join([" ".join(map(str, map(int, list(pt)))) for pt in image.points])+",     "
+        points=format_points(image.points, STR_INT + " " + STR_INT)
     )
     return element
 
@@ -33,7 +76,7 @@ def section_contour_to_xml(contour):
         border=" ".join(map(str, map(int, contour.border))),
         fill=" ".join(map(str, map(int, contour.fill))),
         mode=str(contour.mode),
-        points=",     ".join([" ".join(map(str, map(float, list(pt)))) for pt in contour.points])+",     "
+        points=format_points(contour.points, STR_FLOAT + " " + STR_FLOAT)
     )
     return element
 
@@ -46,7 +89,7 @@ def series_contour_to_xml(contour):
         border=" ".join(map("{:.3f}".format, map(float, contour.border))),
         fill=" ".join(map("{:.3f}".format, map(float, contour.fill))),
         mode=str(contour.mode),
-        points=",     ".join([" ".join(map(str, map(int, list(pt)))) for pt in contour.points])+",     "
+        points=format_points(contour.points, STR_INT + " " + STR_INT)
     )
     return element
 
@@ -186,44 +229,42 @@ def zcontour_to_xml(zcontour):
         border=" ".join(map("{:.3f}".format, zcontour.border)),
         fill=" ".join(map("{:.3f}".format, zcontour.fill)),
         mode=str(zcontour.mode),
-        points=",     ".join(["{} {} {:g}".format(*map(float, list(pt))) for pt in zcontour.points])+",     "
+        points=format_points(zcontour.points, STR_FLOAT + " " + STR_FLOAT + " %g")
     )
     return element
 
 
-def entire_section_to_xml(section):
-    # Make root (Section attributes: index, thickness, alignLocked)
-    root = section_to_xml(section)
+def iter_transform_groups(section):
+    """Yield (Transform, child elements) for each Transform node of <section>.
 
-    # Add Transform nodes for images (assumes they can all have different tform)
+    Child elements are created as they are iterated over.
+    """
+    # Transform nodes for images (assumes they can all have different tform)
     for image in section.images:
-        trnsfrm = transform_to_xml(image.transform)
-        img = image_to_xml(image)
         # RECONSTRUCT has a Contour for Images
-        cntr = image_to_contour_xml(image)  # Section or Series?
-        trnsfrm.append(img)
-        trnsfrm.append(cntr)
-        root.append(trnsfrm)  # append images transform node to XML file
+        yield image.transform, [image_to_xml(image), image_to_contour_xml(image)]
 
     # Non-Image Contours
-    # - Build list of unique Transform objects
-    unique_transform = []
+    # - Group contours by equivalent Transform, in order of first appearance
+    transform_groups = OrderedDict()  # Transform.key(): (Transform, contours)
     for contour in section.contours:
-        unique = True
-        for tform in unique_transform:
-            if tform == contour.transform:
-                unique = False
-                break
-        if unique:
-            unique_transform.append(contour.transform)
-
-    # - Add contours to their equivalent Transform objects
-    for transform in unique_transform:
+        key = contour.transform.key()
+        if key not in transform_groups:
+            transform_groups[key] = (contour.transform, [])
+        transform_groups[key][1].append(contour)
+
+    for transform, contours in transform_groups.itervalues():
+        yield transform, (section_contour_to_xml(contour) for contour in contours)
+
+
+def entire_section_to_xml(section):
+    # Make root (Section attributes: index, thickness, alignLocked)
+    root = section_to_xml(section)
+
+    # Add Transform nodes, with Images and Contours
+    for transform, children in iter_transform_groups(section):
         transform_elem = transform_to_xml(transform)
-        for contour in section.contours:
-            if contour.transform == transform:
-                cont = section_contour_to_xml(contour)
-                transform_elem.append(cont)
+        transform_elem.extend(children)
         root.append(transform_elem)
 
     # Make tree and write
@@ -243,30 +284,138 @@ def entire_series_to_xml(series):
     return root
 
 
-def write_section(section, directory, outpath=None, overwrite=False):
-    """Writes <section> to an XML file in directory"""
+def write_section(section, directory, outpath=None, overwrite=False,
+                  stream=False):
+    """Writes <section> to an XML file in directory
+
+    If <stream> is True, elements are written as they are created instead of
+    building the whole tree first (see stream_section_xml).
+    """
     if not outpath:
         outpath = os.path.join(directory, section.name)
 
-    root = entire_section_to_xml(section)
-    elemtree = etree.ElementTree(root)
-
     if os.path.exists(outpath) and not overwrite:
         print("Will not write {} due to overwrite conflict. Set overwrite=True to overwrite".format(section.name))
-        return
-    elemtree.write(outpath, pretty_print=True, xml_declaration=True, encoding="UTF-8")
-
-
-def write_series(series, directory, outpath=None, sections=False, overwrite=False):
-    """Writes <series> to an XML file in directory"""
+        return False
+    if stream:
+        with open(outpath, "wb") as f:
+            stream_section_xml(section, f)
+    else:
+        root = entire_section_to_xml(section)
+        elemtree = etree.ElementTree(root)
+        elemtree.write(outpath, pretty_print=True, xml_declaration=True, encoding="UTF-8")
+    mark_written(section, outpath, section._path, section.name)
+    return True
+
+
+def is_same_file(path, directory, filename):
+    """Return True if path is <filename> in <directory> (which may be None)."""
+    if directory is None:
+        return False
+    other = os.path.join(directory, filename)
+    if os.path.exists(path) and os.path.exists(other):
+        return os.path.samefile(path, other)
+    return os.path.realpath(path) == os.path.realpath(other)
+
+
+def mark_written(obj, path, directory, filename):
+    """Mark Section or Series <obj> clean after writing it to path.
+
+    Only done if path is <filename> in <directory>, the file obj was loaded
+    from, and obj's changes are tracked (it was marked clean before).
+    """
+    if obj._clean_fingerprint is not None and is_same_file(
+            path, directory, filename):
+        obj.mark_clean()
+
+
+def get_dirty_sections(series, directory):
+    """Return Sections of <series> that would change their files in directory.
+
+    A Section is only left out if directory holds its own Section file (the
+    one it was loaded from) and it is unmodified since. Sections of a
+    LazySections that are not in memory are not loaded unless their files are
+    not in directory.
+    """
+    if isinstance(series.sections, LazySections):
+        candidates = series.sections.loaded()
+        loaded = set(section.name for section in candidates)
+        for position, path in enumerate(series.sections.paths):
+            name = os.path.basename(path)
+            if (name not in loaded and not is_same_file(
+                    os.path.join(directory, name), os.path.dirname(path), name)):
+                candidates.append(series.sections[position])
+    else:
+        candidates = series.sections
+    return [
+        section for section in candidates
+        if section.is_dirty() or not is_same_file(
+            os.path.join(directory, section.name), section._path, section.name)
+    ]
+
+
+def stream_section_xml(section, f):
+    """Write <section> as XML to file object f, one element at a time.
+
+    Output is identical to pretty printing entire_section_to_xml(section), but
+    only one Contour element exists at a time.
+    """
+    root = section_to_xml(section)
+    with etree.xmlfile(f, encoding="UTF-8") as xf:
+        xf.write_declaration()
+        if not section.images and not section.contours:
+            xf.write(root)
+        else:
+            with xf.element(root.tag, root.attrib):
+                for transform, children in iter_transform_groups(section):
+                    # Indentation matches pretty_print
+                    xf.write("\n  ")
+                    transform_elem = transform_to_xml(transform)
+                    with xf.element(transform_elem.tag, transform_elem.attrib):
+                        for child in children:
+                            xf.write("\n    ")
+                            xf.write(child)
+                        xf.write("\n  ")
+                xf.write("\n")
+    f.write(b"\n")
+
+
+def write_series(series, directory, outpath=None, sections=False, overwrite=False,
+                 workers=None, threads=False, stream=False, only_dirty=False,
+                 atomic=False, keep_previous=False, fsync_batch=FSYNC_BATCH_SIZE):
+    """Writes <series> to an XML file in directory
+
+    If <sections> is True, Sections are also written, by a pool of <workers>
+    processes (or threads if <threads> is True) when <workers> is greater
+    than 1. <stream> is passed to write_section.
+
+    If <only_dirty> is True, the Series file and Sections are not written if
+    directory holds the files they were loaded from and they are unmodified
+    since (see Section.is_dirty). Other files are left untouched. Only Series
+    loaded with track_changes can skip any files.
+
+    If <atomic> is True, all files are first written to temporary files in
+    directory and fsynced, <fsync_batch> at a time, then renamed into place.
+    A crash before the renames leaves the existing files untouched. If
+    <keep_previous> is True, the files replaced are kept in the
+    PREVIOUS_DIRNAME directory (replacing any older generation).
+    """
     # Check if directory exists, make if does not exist
     if not os.path.exists(directory):
         os.makedirs(directory)
     if not outpath:
         outpath = os.path.join(directory, series.name + ".ser")
 
+    if sections and only_dirty:
+        section_list = get_dirty_sections(series, directory)
+    elif sections:
+        section_list = list(series.sections)
+    write_series_file = (
+        not only_dirty or series.is_dirty() or
+        not is_same_file(outpath, series.path, series.name + ".ser"))
+
     # Raise error if this file already exists to prevent overwrite
-    if not overwrite and os.path.exists(outpath):
+    if write_series_file and not overwrite and os.path.exists(outpath):
         msg = "CAUTION: Files already exist in ths directory: Do you want to overwrite them?"
         # StdOut
         a = input("{} (y/n)".format(msg))
@@ -275,10 +424,165 @@ def write_series(series, directory, outpath=None, sections=False, overwrite=Fals
             raise IOError("\nFilename %s already exists.\nQuiting write command to avoid overwrite"%outpath)
         print ("!!! OVERWRITE ENABLED !!!")
 
+    if atomic:
+        section_list = section_list if sections else []
+        write_series_atomic(
+            series, outpath if write_series_file else None, directory,
+            section_list, overwrite=overwrite, workers=workers,
+            threads=threads, stream=stream, keep_previous=keep_previous,
+            fsync_batch=fsync_batch)
+        return
+
+    if write_series_file:
+        write_series_file_xml(series, outpath)
+    # Write sections if <sections> == True
+    if sections:
+        written = pool_map(
+            partial(write_section, directory=directory, overwrite=overwrite,
+                    stream=stream),
+            section_list, workers=workers, threads=threads)
+        # Sections written by worker processes are marked clean there
+        for section, was_written in zip(section_list, written):
+            if was_written:
+                mark_written(
+                    section, os.path.join(directory, section.name),
+                    section._path, section.name)
+
+
+def write_series_file_xml(series, outpath):
+    """Write only the Series file of <series> to outpath."""
     root = entire_series_to_xml(series)
     elemtree = etree.ElementTree(root)
     elemtree.write(outpath, pretty_print=True, xml_declaration=True, encoding="UTF-8")
-    # Write all sections if <sections> == True
-    if sections:
-        for section in series.sections:
-            write_section(section, directory, overwrite=overwrite)
+    mark_written(series, outpath, series.path, series.name + ".ser")
+
+
+def write_series_atomic(series, outpath, directory, sections, overwrite=False,
+                        workers=None, threads=False, stream=False,
+                        keep_previous=False, fsync_batch=FSYNC_BATCH_SIZE):
+    """Write the Series file (unless <outpath> is None) and <sections> atomically.
+
+    See write_series.
+    """
+    # (object, temporary path, final path) for each file to write
+    files = []
+    if outpath is not None:
+        files.append((series, outpath))
+    for section in sections:
+        path = os.path.join(directory, section.name)
+        if os.path.exists(path) and not overwrite:
+            print("Will not write {} due to overwrite conflict. Set overwrite=True to overwrite".format(section.name))
+            continue
+        files.append((section, path))
+    files = [(obj, make_temp_path(path), path) for obj, path in files]
+
+    try:
+        if outpath is not None:
+            write_series_file_xml(series, files[0][1])
+        section_files = files[1:] if outpath is not None else files
+        pool_map(
+            partial(_write_section_to, stream=stream),
+            [(section, temp_path) for section, temp_path, _ in section_files],
+            workers=workers, threads=threads)
+        fsync_files([temp_path for _, temp_path, _ in files], fsync_batch)
+    except BaseException:
+        for _, temp_path, _ in files:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        raise
+
+    replace_files(
+        [(temp_path, path) for _, temp_path, path in files],
+        keep_previous=keep_previous)
+
+    for obj, _, path in files:
+        if obj is series:
+            source = (series.path, series.name + ".ser")
+        else:
+            source = (obj._path, obj.name)
+        mark_written(obj, path, *source)
+
+
+def _write_section_to(item, stream=False):
+    """Write Section to path, given item (Section, path)."""
+    section, path = item
+    write_section(section, None, outpath=path, overwrite=True, stream=stream)
+
+
+def make_temp_path(path):
+    """Return the path of a new, empty temporary file next to path.
+
+    The file has the permissions of the file at path, or the defaults if none.
+    """
+    # Not named after path, which may end in ".ser" (see get_series_path)
+    handle, temp_path = tempfile.mkstemp(
+        prefix=TEMP_PREFIX, suffix=".tmp", dir=os.path.dirname(path))
+    os.close(handle)
+    if os.path.exists(path):
+        shutil.copymode(path, temp_path)
+    else:
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_path, 0o666 & ~umask)
+    return temp_path
+
+
+def fsync_files(paths, batch_size=FSYNC_BATCH_SIZE):
+    """Flush files at paths to disk, <batch_size> at a time.
+
+    Each batch of files is opened together, then fsynced. All files are
+    written before any are flushed, so most file systems can combine their
+    flushes instead of waiting on the disk once per file write.
+    """
+    for start in range(0, len(paths), batch_size):
+        handles = [os.open(path, os.O_RDWR) for path in paths[start:start + batch_size]]
+        try:
+            for handle in handles:
+                os.fsync(handle)
+        finally:
+            for handle in handles:
+                os.close(handle)
+
+
+def replace_files(pairs, keep_previous=False):
+    """Rename each (source, destination) pair, replacing any destination.
+
+    If <keep_previous> is True, replaced destinations are first kept in the
+    PREVIOUS_DIRNAME directory next to them, replacing any kept before.
+    """
+    directories = set(os.path.dirname(destination) for _, destination in pairs)
+    if keep_previous:
+        for directory in directories:
+            previous = os.path.join(directory, PREVIOUS_DIRNAME)
+            if os.path.isdir(previous):
+                shutil.rmtree(previous)
+            os.makedirs(previous)
+    for source, destination in pairs:
+        if keep_previous and os.path.exists(destination):
+            kept = os.path.join(
+                os.path.dirname(destination), PREVIOUS_DIRNAME,
+                os.path.basename(destination))
+            try:
+                os.link(destination, kept)
+            except (AttributeError, OSError):  # no hard links
+                shutil.copy2(destination, kept)
+        try:
+            os.rename(source, destination)
+        except OSError:
+            # Windows cannot rename onto an existing file
+            if os.name != "nt" or not os.path.exists(destination):
+                raise
+            os.remove(destination)
+            os.rename(source, destination)
+    # Make the renames themselves durable
+    for directory in directories:
+        try:
+            handle = os.open(directory, os.O_RDONLY)
+        except OSError:  # e.g. directories cannot be opened on Windows
+            continue
+        try:
+            os.fsync(handle)
+        except OSError:
+            pass
+        finally:
+            os.close(handle)
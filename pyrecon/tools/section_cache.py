@@ -0,0 +1,265 @@
+"""Functions for caching parsed Sections in a binary form next to their XML files.
+
+A cached Section is a NumPy .npz file holding:
+    meta: JSON with the cache key, Section attributes, Images, the distinct
+          Transforms (and which one each Transform element uses) and the
+          distinct Contour names and comments
+    contours: a structured array with one row of attributes per Contour
+    points: every Contour's points, concatenated into one (N, 2) array
+
+The cache key is the Section file's path, size, modification time and SHA-1.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+
+import numpy
+
+from pyrecon.tools.reconstruct_reader import get_classes, process_section_file
+
+CACHE_VERSION = 1
+CACHE_DIRNAME = ".pyrecon_cache"
+
+CONTOUR_DTYPE = numpy.dtype([
+    ("name", numpy.int32),  # index into meta["names"]
+    ("comment", numpy.int32),  # index into meta["comments"]
+    ("transform", numpy.int32),  # index into meta["groups"]
+    ("hidden", numpy.bool_),
+    ("closed", numpy.bool_),
+    ("simplified", numpy.bool_),
+    ("mode", numpy.int32),
+    ("border", numpy.float64, 3),
+    ("fill", numpy.float64, 3),
+    ("start", numpy.int64),  # rows of points
+    ("stop", numpy.int64),
+])
+
+
+def process_section_file_cached(path, compact=False, cache_dir=None,
+                                track_changes=False):
+    """Return a Section from its cache if valid, else from XML file at path.
+
+    Sections parsed from XML are cached for next time, if possible. If
+    <track_changes> is True, the Section is marked clean.
+    """
+    cache_path = get_cache_path(path, cache_dir)
+    key = get_file_key(path)
+    section = load_section(
+        cache_path, key, compact=compact, track_changes=track_changes)
+    if section is None:
+        section = process_section_file(
+            path, compact=compact, track_changes=track_changes)
+        save_section(section, cache_path, key)
+    return section
+
+
+def get_cache_path(path, cache_dir=None):
+    """Return cache file path for Section file <path>.
+
+    By default the cache is kept in a directory next to the Section file.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(path), CACHE_DIRNAME)
+        filename = os.path.basename(path)
+    else:
+        # Sections of different Series may share cache_dir
+        digest = hashlib.sha1(os.path.abspath(path)).hexdigest()[:12]
+        filename = "{}-{}".format(os.path.basename(path), digest)
+    return os.path.join(cache_dir, filename + ".npz")
+
+
+def get_file_key(path):
+    """Return [path, size, mtime, None] for the file at path.
+
+    The SHA-1 (None here) is filled in by get_file_sha1 only when needed.
+    """
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime, None]
+
+
+def get_file_sha1(path):
+    """Return the SHA-1 hex digest of the file at path."""
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def load_section(cache_path, key, compact=False, track_changes=False):
+    """Return the Section cached at cache_path, or None if missing or stale.
+
+    The path, size and mtime in <key> are checked before the file's SHA-1 is
+    computed (and stored in <key>) and compared. If <track_changes> is True,
+    the Section is marked clean.
+    """
+    (contour_class, image_class, section_class, transform_class,
+     _) = get_classes(compact)
+    try:
+        with numpy.load(cache_path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if (meta["version"] != CACHE_VERSION or
+                    meta["key"][:3] != key[:3]):
+                return None
+            if key[3] is None:
+                key[3] = get_file_sha1(key[0])
+            if meta["key"][3] != key[3]:
+                return None
+            table = data["contours"]
+            points = data["points"]
+    except (IOError, OSError, KeyError, ValueError, zipfile.BadZipfile):
+        return None
+
+    data = meta["section"]
+    data["name"] = str(data["name"])
+    data["_path"] = str(data["_path"])
+    section = section_class(**data)
+    distinct = [
+        dict(zip(("dim", "xcoef", "ycoef"), transform))
+        for transform in meta["transforms"]
+    ]
+    # One Transform per XML Transform element, as when parsed
+    transforms = [transform_class(**distinct[i]) for i in meta["groups"]]
+    for image_data in meta["images"]:
+        image_data = dict((str(k), v) for k, v in image_data.iteritems())
+        for attribute in ("src", "name"):
+            image_data[attribute] = str(image_data[attribute])
+        image_data["transform"] = transforms[image_data["transform"]]
+        image_data["border"] = tuple(image_data["border"])
+        image_data["fill"] = tuple(image_data["fill"])
+        image_data["_path"] = section._path
+        section.images.append(image_class(**image_data))
+
+    names = [str(name) for name in meta["names"]]
+    comments = [str(comment) for comment in meta["comments"]]
+    for row in table.tolist():
+        (name, comment, transform, hidden, closed, simplified, mode, border,
+         fill, start, stop) = row
+        section.contours.append(contour_class(
+            name=names[name],
+            comment=comments[comment],
+            hidden=hidden,
+            closed=closed,
+            simplified=simplified,
+            mode=mode,
+            border=tuple(border),
+            fill=tuple(fill),
+            points=points[start:stop],
+            transform=transforms[transform],
+        ))
+    if track_changes:
+        section.mark_clean()
+    return section
+
+
+def save_section(section, cache_path, key):
+    """Cache <section> at cache_path under key. Return True if successful.
+
+    Failing to write the cache (e.g. in a read-only directory) is not an error.
+    """
+    if key[3] is None:
+        key[3] = get_file_sha1(key[0])
+
+    # Number Transforms by object, and their distinct values
+    groups = []
+    group_positions = {}  # id(Transform): position in groups
+    distinct_positions = {}  # Transform.key(): position in distinct
+    distinct = []
+
+    def transform_position(transform):
+        position = group_positions.get(id(transform))
+        if position is None:
+            transform_key = transform.key()
+            if transform_key not in distinct_positions:
+                distinct_positions[transform_key] = len(distinct)
+                distinct.append(
+                    [transform.dim, list(transform.xcoef), list(transform.ycoef)])
+            position = group_positions[id(transform)] = len(groups)
+            groups.append(distinct_positions[transform_key])
+        return position
+
+    images = []
+    for image in section.images:
+        images.append({
+            "src": image.src,
+            "mag": image.mag,
+            "contrast": image.contrast,
+            "brightness": image.brightness,
+            "red": image.red,
+            "green": image.green,
+            "blue": image.blue,
+            "name": image.name,
+            "hidden": image.hidden,
+            "closed": image.closed,
+            "simplified": image.simplified,
+            "border": list(image.border),
+            "fill": list(image.fill),
+            "mode": image.mode,
+            "points": numpy.asarray(image.points).tolist(),
+            "transform": transform_position(image.transform),
+        })
+
+    names = {}
+    comments = {}
+    table = numpy.zeros(len(section.contours), dtype=CONTOUR_DTYPE)
+    point_arrays = []
+    stops = []
+    for contour in section.contours:
+        point_arrays.append(
+            numpy.asarray(contour.points, dtype=numpy.float64).reshape((-1, 2)))
+        stops.append((stops[-1] if stops else 0) + len(point_arrays[-1]))
+    contours = section.contours
+    table["name"] = [names.setdefault(c.name, len(names)) for c in contours]
+    table["comment"] = [
+        comments.setdefault(c.comment, len(comments)) for c in contours]
+    table["transform"] = [transform_position(c.transform) for c in contours]
+    for column in ("hidden", "closed", "simplified", "mode", "border", "fill"):
+        table[column] = [getattr(c, column) for c in contours]
+    table["stop"] = stops
+    table["start"][1:] = stops[:-1]
+
+    meta = {
+        "version": CACHE_VERSION,
+        "key": key,
+        "section": {
+            "name": section.name,
+            "index": section.index,
+            "thickness": section.thickness,
+            "alignLocked": section.alignLocked,
+            "_path": section._path,
+        },
+        "transforms": distinct,
+        "groups": groups,
+        "images": images,
+        "names": sorted(names, key=names.get),
+        "comments": sorted(comments, key=comments.get),
+    }
+    if point_arrays:
+        points = numpy.concatenate(point_arrays)
+    else:
+        points = numpy.zeros((0, 2))
+
+    # Write to a temporary file, then rename so readers never see partial files
+    try:
+        cache_dir = os.path.dirname(cache_path)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        handle, temp_path = tempfile.mkstemp(suffix=".npz", dir=cache_dir)
+        try:
+            with os.fdopen(handle, "wb") as f:
+                numpy.savez(
+                    f, meta=numpy.array(json.dumps(meta)), contours=table,
+                    points=points)
+            # mkstemp creates files readable only by their owner
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(temp_path, 0o666 & ~umask)
+            os.rename(temp_path, cache_path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+    except (IOError, OSError):
+        return False
+    return True
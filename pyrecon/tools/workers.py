@@ -0,0 +1,35 @@
+"""Functions for spreading work across a pool of worker processes or threads."""
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+
+def pool_map(function, items, workers=None, threads=False, callback=None):
+    """Return a list of function(item) for each item, in input order.
+
+    With <workers> of None or 1 the items are processed serially in this
+    process. Otherwise they are distributed across a pool of <workers>
+    processes, or threads if <threads> is True. A process pool requires
+    <function>, <items> and the results to be picklable.
+
+    If given, callback(completed, total) is called in this process as each
+    result becomes available.
+    """
+    items = list(items)
+    total = len(items)
+    if not workers or workers <= 1:
+        pool = None
+        results = (function(item) for item in items)
+    else:
+        pool = ThreadPool(workers) if threads else Pool(workers)
+        results = pool.imap(function, items)
+    try:
+        output = []
+        for result in results:
+            output.append(result)
+            if callback is not None:
+                callback(len(output), total)
+        return output
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
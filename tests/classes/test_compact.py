@@ -0,0 +1,44 @@
+import pickle
+from unittest import TestCase
+
+from pyrecon.classes import Contour, Section, Transform
+from pyrecon.classes.compact import (
+    CompactContour, CompactImage, CompactSection, CompactTransform,
+    CompactZContour
+)
+
+
+class CompactTests(TestCase):
+
+    def test_no_instance_dict(self):
+        for cls in (CompactContour, CompactImage, CompactSection,
+                    CompactTransform, CompactZContour):
+            instance = cls()
+            self.assertFalse(hasattr(instance, "__dict__"))
+            self.assertRaises(AttributeError, setattr, instance, "unknown", 1)
+
+    def test_eq(self):
+        kwargs = {
+            "name": "d124_cfa_10_mac",
+            "closed": False,
+            "points": [(25.3974, 12.0386), (25.3225, 11.9327)],
+            "transform": Transform(dim=0, xcoef=[0, 1, 0, 0, 0, 0],
+                                   ycoef=[0, 0, 1, 0, 0, 0]),
+        }
+        contour = Contour(**kwargs)
+        compact_contour = CompactContour(**kwargs)
+        self.assertEqual(contour, compact_contour)
+        self.assertEqual(compact_contour, contour)
+        self.assertEqual(compact_contour.shape.type, "LineString")
+
+        section = Section(index=1, thickness=0.05, alignLocked=False)
+        compact_section = CompactSection(
+            index=1, thickness=0.05, alignLocked=False)
+        self.assertEqual(section.attributes(), compact_section.attributes())
+        self.assertTrue(section.eq(compact_section, "attributes"))
+
+    def test_pickle(self):
+        contour = CompactContour(name="a", points=[(1.0, 2.0)])
+        unpickled = pickle.loads(pickle.dumps(contour, 2))
+        self.assertIsInstance(unpickled, CompactContour)
+        self.assertEqual(unpickled, contour)
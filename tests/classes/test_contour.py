@@ -1,3 +1,4 @@
+import pickle
 from unittest import TestCase
 
 from pyrecon.classes import Contour, Transform
@@ -22,6 +23,32 @@ class ContourTests(TestCase):
         )
         self.assertEqual(poly_contour.shape.type, "Polygon")
 
+    def test_pickle_cached(self):
+        transform = Transform(
+            dim=0,
+            xcoef=[0, 1, 0, 0, 0, 0],
+            ycoef=[0, 0, 1, 0, 0, 0],
+        )
+        contour = Contour(
+            name="a",
+            comment="",
+            closed=True,
+            points=[(19.2342, 15.115), (19.2826, 15.115), (19.2584, 15.1593)],
+            transform=transform,
+        )
+        content_hash = contour.content_hash()
+        # The cached shape and hash are not pickled
+        self.assertNotIn("_shape", contour.__getstate__())
+        self.assertNotIn("_content_hash", contour.__getstate__())
+        contours = pickle.loads(pickle.dumps([contour, contour, transform], 2))
+        unpickled = contours[0]
+        self.assertEqual(unpickled, contour)
+        self.assertEqual(unpickled.comment, contour.comment)
+        self.assertIs(contours[1], unpickled)
+        self.assertIs(unpickled.transform, contours[2])
+        self.assertIsNone(unpickled._shape)
+        self.assertEqual(unpickled.content_hash(), content_hash)
+
     def test_shape_weird_line(self):
         transform = Transform(
             dim=0,
@@ -69,3 +96,74 @@ class ContourTests(TestCase):
             transform=transform,
         )
         self.assertEqual(point_contour.shape.type, "Point")
+
+    def test_shape_cached(self):
+        transform = Transform(
+            dim=0,
+            xcoef=[0, 1, 0, 0, 0, 0],
+            ycoef=[0, 0, 1, 0, 0, 0],
+        )
+        contour = Contour(
+            closed=True,
+            points=[
+                (19.2342, 15.115),
+                (19.2826, 15.115),
+                (19.2584, 15.1593),
+            ],
+            transform=transform,
+        )
+        shape = contour.shape
+        self.assertIs(contour.shape, shape)
+
+        # Reassigning points, closed or transform invalidates the shape
+        contour.points = [(19.2342, 15.115), (19.2826, 15.115)]
+        self.assertEqual(contour.shape.type, "LineString")
+        contour.closed = False
+        contour.points = [(19.2342, 15.115)]
+        self.assertEqual(contour.shape.type, "Point")
+        contour.transform = Transform(
+            dim=1,
+            xcoef=[1, 1, 0, 0, 0, 0],
+            ycoef=[1, 0, 1, 0, 0, 0],
+        )
+        self.assertEqual(contour.shape.coords[0], (18.2342, 14.115))
+
+        # So does changing the transform's coefficients
+        contour.transform.xcoef = [2, 1, 0, 0, 0, 0]
+        self.assertEqual(contour.shape.coords[0], (17.2342, 14.115))
+
+    def test_content_hash(self):
+        def make_contour(**kwargs):
+            contour_kwargs = {
+                "name": "d124_cfa_10_mac",
+                "closed": True,
+                "points": [
+                    (19.2342, 15.115),
+                    (19.2826, 15.115),
+                    (19.2584, 15.1593),
+                ],
+                "transform": Transform(
+                    dim=0,
+                    xcoef=[0, 1, 0, 0, 0, 0],
+                    ycoef=[0, 0, 1, 0, 0, 0],
+                ),
+            }
+            contour_kwargs.update(kwargs)
+            return Contour(**contour_kwargs)
+
+        contour = make_contour()
+        content_hash = contour.content_hash()
+        self.assertEqual(make_contour().content_hash(), content_hash)
+        self.assertNotEqual(make_contour(name="other").content_hash(), content_hash)
+        self.assertNotEqual(make_contour(closed=False).content_hash(), content_hash)
+        self.assertNotEqual(
+            make_contour(transform=Transform(
+                dim=1,
+                xcoef=[1, 1, 0, 0, 0, 0],
+                ycoef=[0, 0, 1, 0, 0, 0],
+            )).content_hash(),
+            content_hash,
+        )
+
+        contour.points = [(19.2342, 15.115), (19.2826, 15.115), (19.2584, 15.16)]
+        self.assertNotEqual(contour.content_hash(), content_hash)
@@ -0,0 +1,87 @@
+import copy
+import pickle
+from unittest import TestCase
+
+import numpy
+
+from pyrecon.classes import Contour, Points, ZContour
+from pyrecon.classes.points import to_points
+
+
+class PointsTests(TestCase):
+    point_tuples = [
+        (19.2342, 15.115),
+        (19.2826, 15.115),
+        (19.2584, 15.1593),
+    ]
+
+    def test_to_points(self):
+        points = to_points(self.point_tuples)
+        self.assertIsInstance(points, Points)
+        self.assertEqual(points.shape, (3, 2))
+        self.assertEqual(points.dtype, numpy.float64)
+        self.assertEqual(points.nbytes, 16 * 3)
+        self.assertIs(to_points(points), points)
+        self.assertEqual(to_points([]).shape, (0, 2))
+        self.assertEqual(to_points([], width=3).shape, (0, 3))
+
+    def test_eq(self):
+        points = to_points(self.point_tuples)
+        self.assertTrue(points == self.point_tuples)
+        self.assertTrue(self.point_tuples == points)
+        self.assertTrue(points == to_points(self.point_tuples))
+        self.assertFalse(points != self.point_tuples)
+        self.assertTrue(points != self.point_tuples[:2])
+        self.assertTrue(points != self.point_tuples[::-1])
+        self.assertTrue(to_points([]) == [])
+        self.assertTrue(points[0] == self.point_tuples[0])
+        self.assertFalse(points[0] == points[-1])
+
+    def test_truth(self):
+        self.assertTrue(to_points(self.point_tuples))
+        self.assertFalse(to_points([]))
+
+    def test_arithmetic_returns_arrays(self):
+        points = to_points(self.point_tuples)
+        self.assertIs(type(points * 2), numpy.ndarray)
+        self.assertIs(type(numpy.asarray(points)), numpy.ndarray)
+        self.assertIsInstance(points.sum(), float)
+
+    def test_copy_and_pickle(self):
+        points = to_points(self.point_tuples)
+        self.assertIsInstance(copy.deepcopy(points), Points)
+        unpickled = pickle.loads(pickle.dumps(points, 2))
+        self.assertIsInstance(unpickled, Points)
+        self.assertEqual(unpickled, points)
+
+    def test_classes_store_points(self):
+        contour = Contour(points=self.point_tuples)
+        self.assertIsInstance(contour.points, Points)
+        self.assertEqual(contour, Contour(points=to_points(self.point_tuples)))
+        zcontour = ZContour(points=[(1.0, 2.0, 3)])
+        self.assertEqual(zcontour.points.shape, (1, 3))
+        self.assertEqual(Contour().points.shape, (0, 2))
+
+    def test_contains(self):
+        points = to_points(self.point_tuples)
+        self.assertIn(self.point_tuples[1], points)
+        self.assertIn(list(self.point_tuples[1]), points)
+        self.assertNotIn((19.2342, 15.1593), points)
+        self.assertNotIn((19.2342,), points)
+        self.assertNotIn("a", points)
+        self.assertNotIn(self.point_tuples[0], to_points([]))
+        self.assertIn(19.2342, points[0])
+
+    def test_indexing(self):
+        points = to_points(self.point_tuples)
+        for selected in (points[0], points[1:], points[::2], points[[0, 2]],
+                         points[:, :], points[numpy.array([True, False, True])]):
+            self.assertIsInstance(selected, Points)
+        # Coordinates are plain arrays, so comparisons are elementwise
+        for selected in (points[:, 0], points[:, :1], points[..., 1],
+                         points[0, :1], points[None]):
+            self.assertIs(type(selected), numpy.ndarray)
+        self.assertEqual(
+            (points[:, 1] == 15.115).tolist(), [True, True, False])
+        self.assertEqual(numpy.where(points[:, 0] > 19.25)[0].tolist(), [1, 2])
+        self.assertIsInstance(points[0, 1], float)
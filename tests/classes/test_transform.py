@@ -0,0 +1,81 @@
+import pickle
+from unittest import TestCase
+
+import numpy
+
+from pyrecon.classes import Transform
+from pyrecon.classes.compact import CompactTransform
+from pyrecon.classes.transform import polynomial_inverse, polynomial_inverse_scalar
+
+
+class TransformTests(TestCase):
+    polynomial_kwargs = {
+        "dim": 6,
+        "xcoef": [0.5, 1.01, 0.02, 0.0001, 0.0002, 0.0003],
+        "ycoef": [0.25, 0.01, 0.99, 0.0003, 0.0001, 0.0002],
+    }
+
+    def test_tform_cached(self):
+        transform = Transform(dim=1, xcoef=[2, 1, 0, 0, 0, 0],
+                              ycoef=[3, 0, 1, 0, 0, 0])
+        tform = transform._tform
+        self.assertIs(transform._tform, tform)
+        numpy.testing.assert_allclose(tform(numpy.array([[0.0, 0.0]])), [[2, 3]])
+
+    def test_tform_invalidated(self):
+        transform = Transform(dim=1, xcoef=[2, 1, 0, 0, 0, 0],
+                              ycoef=[3, 0, 1, 0, 0, 0])
+        tform = transform._tform
+
+        transform.xcoef = [4, 1, 0, 0, 0, 0]
+        numpy.testing.assert_allclose(
+            transform._tform(numpy.array([[0.0, 0.0]])), [[4, 3]])
+
+        transform.ycoef[0] = 5
+        numpy.testing.assert_allclose(
+            transform._tform(numpy.array([[0.0, 0.0]])), [[4, 5]])
+
+        transform.dim = 0
+        numpy.testing.assert_allclose(
+            transform._tform(numpy.array([[0.0, 0.0]])), [[0, 0]])
+        self.assertIsNot(transform._tform, tform)
+
+    def test_tform_shared(self):
+        transform1 = Transform(**self.polynomial_kwargs)
+        transform2 = CompactTransform(**self.polynomial_kwargs)
+        self.assertIs(transform1._tform, transform2._tform)
+        self.assertEqual(transform1.key(), transform2.key())
+        self.assertIsNone(Transform()._tform)
+
+    def test_pickle_compiled(self):
+        transform = Transform(**self.polynomial_kwargs)
+        transform._tform
+        unpickled = pickle.loads(pickle.dumps(transform, 2))
+        self.assertEqual(unpickled, transform)
+        self.assertIs(unpickled._tform, transform._tform)
+
+    def test_polynomial_inverse(self):
+        transform = Transform(**self.polynomial_kwargs)
+        tform = transform._tform
+        angles = numpy.linspace(0, 2 * numpy.pi, 50)
+        expected = numpy.column_stack(
+            (20 + 5 * numpy.cos(angles), 15 + 5 * numpy.sin(angles)))
+        points = tform(expected)
+
+        inverted = tform.inverse(points)
+        numpy.testing.assert_allclose(inverted, expected, atol=5e-10)
+        scalar = polynomial_inverse_scalar(
+            tform, transform.xcoef, transform.ycoef, points)
+        numpy.testing.assert_allclose(inverted, scalar, atol=5e-10)
+
+    def test_polynomial_inverse_singular_jacobian(self):
+        # Singular Jacobian at the initial guess uses the Jacobian transpose
+        xcoef = [1.0, 0.0, 0.0, 0.1, 0.2, 0.0]
+        ycoef = [2.0, 0.0, 0.0, 0.1, 0.0, 0.2]
+        tform = Transform(dim=6, xcoef=xcoef, ycoef=ycoef)._tform
+        points = numpy.array([[1.5, 2.5], [3.0, 4.0], [1.0, 2.0]])
+        numpy.testing.assert_allclose(
+            polynomial_inverse(tform, xcoef, ycoef, points),
+            polynomial_inverse_scalar(tform, xcoef, ycoef, points),
+            atol=5e-10,
+        )
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from pyrecon.tools import merge_cli, reconstruct_reader, reconstruct_writer
+
+
+DATA_LOC = "tests/tools/_data"
+
+
+class MergeCliTests(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        # Series A is missing the first Contour of Series B's Section
+        series = reconstruct_reader.process_series_directory(DATA_LOC)
+        self.path_b = os.path.join(self.tempdir, "series_b")
+        reconstruct_writer.write_series(series, self.path_b, sections=True)
+        series.sections[0].contours.pop(0)
+        self.path_a = os.path.join(self.tempdir, "series_a")
+        reconstruct_writer.write_series(series, self.path_a, sections=True)
+        self.contours_a = self.merged_contours(self.path_a)
+        self.contours_b = self.merged_contours(self.path_b)
+        # Contours unique to Series B are added after Series A's
+        self.contours_union = self.contours_a + self.contours_b[:1]
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def merged_contours(self, outpath):
+        merged = reconstruct_reader.process_series_directory(outpath)
+        return merged.sections[0].contours
+
+    def test_policies(self):
+        expected = {
+            "a": self.contours_a,
+            "b": self.contours_b,
+            "union": self.contours_union,
+        }
+        for policy, contours in expected.items():
+            outpath = os.path.join(self.tempdir, policy)
+            status = merge_cli.main(
+                [self.path_a, self.path_b, outpath, "--policy", policy, "--quiet"])
+            self.assertEqual(status, 0)
+            self.assertEqual(self.merged_contours(outpath), contours)
+
+    def test_batch(self):
+        outpath = os.path.join(self.tempdir, "out")
+        batch_path = os.path.join(self.tempdir, "pairs.txt")
+        with open(batch_path, "w") as f:
+            f.write("# Series A, Series B, output\n\n")
+            f.write("{} {} {}\n".format(self.path_a, self.path_b, outpath))
+            f.write("{} {} {}\n".format(
+                os.path.join(self.tempdir, "missing"), DATA_LOC,
+                os.path.join(self.tempdir, "failed")))
+        self.assertEqual(
+            merge_cli.read_batch_file(batch_path)[0],
+            (self.path_a, self.path_b, outpath))
+
+        # The failed merge does not stop the other
+        status = merge_cli.main(
+            ["--batch", batch_path, "--policy", "union", "--workers", "2",
+             "--quiet"])
+        self.assertEqual(status, 1)
+        self.assertEqual(self.merged_contours(outpath), self.contours_union)
+
+        # Existing output is only replaced with --overwrite
+        self.assertRaises(
+            IOError, merge_cli.merge_series, self.path_a, self.path_b, outpath)
+        merge_cli.merge_series(
+            self.path_a, self.path_b, outpath, policy="a", overwrite=True)
+        self.assertEqual(self.merged_contours(outpath), self.contours_a)
+
+    def test_bad_arguments(self):
+        self.assertRaises(SystemExit, merge_cli.main, [])
+        self.assertRaises(SystemExit, merge_cli.main, [DATA_LOC, DATA_LOC])
+        self.assertRaises(
+            SystemExit, merge_cli.main,
+            [DATA_LOC, DATA_LOC, self.tempdir, "--policy", "c"])
@@ -1,9 +1,15 @@
+import os
+import shutil
+import tempfile
 from unittest import TestCase
 
 import numpy
 from shapely.geometry import LineString, Point, Polygon
 
-from pyrecon.tools import mergetool
+from pyrecon.classes import Contour, Image, Section, Transform
+from pyrecon.tools import mergetool, reconstruct_reader
+
+DATA_LOC = "tests/tools/_data"
 
 
 class MergetoolTests(TestCase):
@@ -375,3 +381,296 @@ class MergetoolTests(TestCase):
         different_line = LineString(numpy.asarray(different_line_points))
         self.assertFalse(
             mergetool.is_potential_duplicate(line, different_line))
+
+    def make_section(self, contours):
+        return Section(
+            name="_test.1", index=1, thickness=0.05, alignLocked=False,
+            images=[Image(src="test.tif")], contours=contours)
+
+    def make_contour(self, name, points, closed=True):
+        return Contour(
+            name=name,
+            closed=closed,
+            points=points,
+            transform=Transform(
+                dim=0,
+                xcoef=[0, 1, 0, 0, 0, 0],
+                ycoef=[0, 0, 1, 0, 0, 0],
+            ),
+        )
+
+    def make_merge_section(self):
+        close_polygon_points = [
+            (15.0988, 17.5196),
+            (15.3815, 17.4754),
+            (15.5936, 17.4489),
+            (15.9116, 17.7228),
+            (16.0265, 18.1292),
+            (15.6731, 18.2529),
+            (15.249, 17.9701),
+            (15.0988, 17.5284),
+        ]
+        far_polygon_points = [
+            (9.2342, 5.115),
+            (9.2826, 5.115),
+            (9.2584, 5.1593),
+        ]
+        line_points = [
+            (24.6589, 17.3004),
+            (24.7018, 17.3489),
+            (24.7634, 17.3917),
+        ]
+        shifted_line_points = [(x + 1e-7, y) for x, y in line_points]
+        self.section1_contours = [
+            self.make_contour("a", self.polygon_points),
+            self.make_contour("a", far_polygon_points),
+            self.make_contour("p", [(13.5904, 16.6472)], closed=False),
+            self.make_contour("b", self.polygon_points),
+            self.make_contour("l", line_points, closed=False),
+        ]
+        self.section2_contours = [
+            self.make_contour("a", self.polygon_points),
+            self.make_contour("a", close_polygon_points),
+            self.make_contour("p", [(13.5904, 16.6472)], closed=False),
+            self.make_contour("c", self.polygon_points),
+            self.make_contour("l", shifted_line_points, closed=False),
+        ]
+        return mergetool.MergeSection(
+            name="_test.1",
+            section1=self.make_section(self.section1_contours),
+            section2=self.make_section(self.section2_contours),
+        )
+
+    def test_get_categorized_contours(self):
+        merge_section = self.make_merge_section()
+        a1, a2, a3, a4, a5 = self.section1_contours
+        b1, b2, b3, b4, b5 = self.section2_contours
+
+        self.assertEqual(merge_section.section_1_unique_contours, [a2, a4])
+        self.assertEqual(merge_section.section_2_unique_contours, [b4])
+        self.assertEqual(merge_section.definite_shared_contours, [a1, a3])
+        self.assertEqual(
+            merge_section.potential_shared_contours, [[a1, b2], [a5, b5]])
+        self.assertIsNone(merge_section.contours)
+
+        # Content hashes only skip geometric comparisons
+        self.assertEqual(
+            merge_section.getCategorizedContours(
+                include_overlaps=True, use_hashes=False),
+            merge_section.getCategorizedContours(include_overlaps=True),
+        )
+
+    def test_get_categorized_contours_collapsed(self):
+        # A zero-area trace is not an exact duplicate, even of itself
+        collapsed_points = [(1.0, 1.0), (2.0, 2.0), (3.0, 3.0), (1.0, 1.0)]
+        contA = self.make_contour("z", collapsed_points)
+        contB = self.make_contour("z", collapsed_points)
+        self.assertEqual(contA.shape.area, 0)
+        self.assertEqual(contA.content_hash(), contB.content_hash())
+        merge_section = mergetool.MergeSection(
+            name="_test.1",
+            section1=self.make_section([contA]),
+            section2=self.make_section([contB]),
+        )
+        self.assertEqual(merge_section.section_1_unique_contours, [contA])
+        self.assertEqual(merge_section.section_2_unique_contours, [contB])
+        self.assertEqual(merge_section.definite_shared_contours, [])
+        self.assertEqual(
+            merge_section.getCategorizedContours(
+                include_overlaps=True, use_hashes=False),
+            merge_section.getCategorizedContours(include_overlaps=True),
+        )
+
+    def test_get_categorized_contours_unmatched_empty(self):
+        # Contours without candidates are not made into shapes
+        contA = self.make_contour("a", self.polygon_points)
+        empty = Contour(name="empty", closed=None)
+        merge_section = mergetool.MergeSection(
+            name="_test.1",
+            section1=self.make_section([contA, empty]),
+            section2=self.make_section(
+                [self.make_contour("a", self.polygon_points)]),
+        )
+        self.assertEqual(
+            merge_section.getCategorizedContours(), ([empty], []))
+        self.assertEqual(merge_section.definite_shared_contours, [contA])
+
+    def test_get_categorized_contours_equal_overlaps(self):
+        # Potential pairs are only dropped if both Contours equal (==)
+        # Section1 Contours with exact duplicates
+        shifted_points = [(x + 0.01, y) for x, y in self.polygon_points]
+        a1 = self.make_contour("a", self.polygon_points)
+        a2 = self.make_contour("b", shifted_points)
+        b1 = self.make_contour("c", shifted_points)
+        b2 = self.make_contour("d", self.polygon_points)
+        merge_section = mergetool.MergeSection(
+            name="_test.1",
+            section1=self.make_section([a1, a2]),
+            section2=self.make_section([b1, b2]),
+        )
+        for use_hashes in (True, False):
+            unique1, unique2, definite, potential = merge_section.getCategorizedContours(
+                sameName=False, include_overlaps=True, use_hashes=use_hashes)
+            self.assertEqual(definite, [a1, a2])
+            self.assertEqual(
+                [[id(contA), id(contB)] for contA, contB in potential],
+                [[id(a1), id(b1)], [id(a2), id(b2)]])
+
+    def test_content_hash_rename(self):
+        contour = self.make_contour("a", self.polygon_points)
+        content_hash = contour.content_hash()
+        contour.name = "b"
+        self.assertNotEqual(contour.content_hash(), content_hash)
+        self.assertEqual(
+            contour.content_hash(),
+            self.make_contour("b", self.polygon_points).content_hash())
+
+    def test_get_categorized_contours_any_name(self):
+        merge_section = self.make_merge_section()
+        a1, a2, a3, a4, a5 = self.section1_contours
+        b1, b2, b3, b4, b5 = self.section2_contours
+
+        unique1, unique2, definite, potential = merge_section.getCategorizedContours(
+            sameName=False, include_overlaps=True)
+        self.assertEqual(unique1, [a2])
+        self.assertEqual(unique2, [])
+        self.assertEqual(definite, [a1, a1, a3, a4, a4])
+        self.assertEqual(
+            potential, [[a1, b2], [a4, b2], [a5, b5]])
+
+    def test_create_merge_set_workers(self):
+        series1 = reconstruct_reader.process_series_directory(DATA_LOC)
+        series2 = reconstruct_reader.process_series_directory(DATA_LOC)
+        progress = []
+        merge_set = mergetool.createMergeSet(
+            series1, series2, workers=2,
+            callback=lambda done, total: progress.append((done, total)))
+        self.assertEqual(progress, [(1, 1)])
+        self.assertEqual(len(merge_set.sectionMerges), 1)
+        merge_section = merge_set.sectionMerges[0]
+        self.assertEqual(merge_section.name, "_VRJXH.98")
+        self.assertEqual(merge_section.section1.index, 98)
+        self.assertTrue(merge_section.isDone())
+        self.assertEqual(
+            len(merge_section.definite_shared_contours),
+            len(series1.sections[0].contours),
+        )
+
+    def test_get_categorized_zcontours(self):
+        series1 = reconstruct_reader.process_series_directory(DATA_LOC)
+        series2 = reconstruct_reader.process_series_directory(DATA_LOC)
+        zcontour = series1.zcontours[0]
+        # A repeated ZContour overlaps at most one ZContour of the other Series
+        series1.zcontours.append(zcontour)
+        merge_series = mergetool.MergeSeries(series1=series1, series2=series2)
+
+        unique1, unique2, overlapping = merge_series.getCategorizedZContours()
+        self.assertEqual(unique1, [zcontour])
+        self.assertIs(unique1[0], series1.zcontours[-1])
+        self.assertEqual(unique2, [])
+        self.assertEqual(overlapping, series1.zcontours[:-1])
+
+    def test_to_section_clean(self):
+        series1 = reconstruct_reader.process_series_directory(
+            DATA_LOC, track_changes=True)
+        series2 = reconstruct_reader.process_series_directory(DATA_LOC)
+        merge_set = mergetool.createMergeSet(series1, series2)
+        merge_section = merge_set.sectionMerges[0]
+        self.assertFalse(merge_section.toSection().is_dirty())
+        self.assertFalse(merge_set.seriesMerge.toSeries().is_dirty())
+        merge_section.contours = merge_section.contours[:-1]
+        self.assertTrue(merge_section.toSection().is_dirty())
+
+    def test_auto_resolve(self):
+        merge_section = self.make_merge_section()
+        self.assertRaises(ValueError, merge_section.autoResolve, "c")
+        self.assertTrue(merge_section.autoResolve(mergetool.UNION))
+        b4 = self.section2_contours[3]
+        self.assertEqual(merge_section.contours, self.section1_contours + [b4])
+        self.assertIs(merge_section.contours[-1], b4)
+        self.assertTrue(merge_section.isDone())
+        # Resolved stuff is left alone
+        self.assertFalse(merge_section.autoResolve(mergetool.PREFER_B))
+
+        merge_section = self.make_merge_section()
+        merge_section.autoResolve(mergetool.PREFER_B)
+        self.assertIs(merge_section.contours, merge_section.section2.contours)
+
+        series1 = reconstruct_reader.process_series_directory(DATA_LOC)
+        series2 = reconstruct_reader.process_series_directory(DATA_LOC)
+        zcontour = series2.zcontours.pop()
+        contour = series2.contours.pop()
+        merge_set = mergetool.createMergeSet(series2, series1)
+        self.assertEqual(
+            merge_set.autoResolve(mergetool.UNION), [merge_set.seriesMerge.name])
+        self.assertEqual(merge_set.seriesMerge.contours, series2.contours + [contour])
+        self.assertEqual(
+            merge_set.seriesMerge.zcontours, series2.zcontours + [zcontour])
+
+    def test_save_state(self):
+        series1 = reconstruct_reader.process_series_directory(DATA_LOC)
+        series2 = reconstruct_reader.process_series_directory(DATA_LOC)
+        series2.sections[0].contours.pop(0)
+        series2.zcontours.pop()
+        merge_set = mergetool.createMergeSet(series1, series2)
+        merge_section = merge_set.sectionMerges[0]
+        merge_section.contours = (
+            merge_section.section2.contours[:2] +
+            merge_section.section_1_unique_contours)
+        self.assertFalse(merge_set.isDone())
+
+        tempdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempdir, "merge.json.gz")
+            merge_set.saveState(path)
+            # Saving again replaces the saved state
+            merge_set.saveState(path)
+            self.assertEqual(os.listdir(tempdir), ["merge.json.gz"])
+            # Conflicts are not recomputed
+            check_conflicts = mergetool.MergeSection.checkConflicts
+            mergetool.MergeSection.checkConflicts = None
+            try:
+                loaded = mergetool.loadMergeSet(path, series1, series2)
+            finally:
+                mergetool.MergeSection.checkConflicts = check_conflicts
+
+            loaded_section = loaded.sectionMerges[0]
+            for attribute in (
+                    "attributes", "images", "contours",
+                    "section_1_unique_contours", "section_2_unique_contours",
+                    "definite_shared_contours"):
+                expected = getattr(merge_section, attribute)
+                restored = getattr(loaded_section, attribute)
+                self.assertEqual(restored, expected)
+                if isinstance(expected, list):
+                    self.assertEqual(map(id, restored), map(id, expected))
+            self.assertEqual(
+                loaded_section.potential_shared_contours,
+                merge_section.potential_shared_contours)
+            loaded_series = loaded.seriesMerge
+            self.assertEqual(
+                loaded_series.attributes, merge_set.seriesMerge.attributes)
+            self.assertEqual(
+                loaded_series.contours, merge_set.seriesMerge.contours)
+            self.assertIsNone(loaded_series.zcontours)
+            self.assertTrue(loaded_section.isDone())
+            self.assertFalse(loaded.isDone())
+
+            # The saved Series paths hold the unmodified Series2
+            self.assertRaises(ValueError, mergetool.loadMergeSet, path)
+            mergetool.loadMergeSet(path, series1, DATA_LOC, verify=False)
+
+            # Resolutions must come from the merged Series
+            contours = merge_section.contours
+            merge_section.contours = [
+                self.make_contour("a", self.polygon_points)]
+            self.assertRaises(ValueError, merge_set.saveState, path)
+
+            # A failed write leaves the saved state and no temporary file
+            merge_section.contours = contours
+            merge_set.seriesMerge.getState = lambda: object()
+            self.assertRaises(TypeError, merge_set.saveState, path)
+            self.assertEqual(os.listdir(tempdir), ["merge.json.gz"])
+            mergetool.loadMergeSet(path, series1, DATA_LOC, verify=False)
+        finally:
+            shutil.rmtree(tempdir)
@@ -0,0 +1,63 @@
+import shutil
+import tempfile
+from unittest import TestCase
+
+import numpy
+
+from pyrecon.classes import Points
+from pyrecon.tools import point_store, reconstruct_reader
+
+
+DATA_LOC = "tests/tools/_data"
+
+
+class PointStoreTests(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.series = reconstruct_reader.process_series_directory(DATA_LOC)
+        self.section = self.series.sections[0]
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_export_point_store(self):
+        count = point_store.export_point_store(DATA_LOC, self.tempdir)
+        self.assertEqual(
+            count, sum(len(contour.points) for contour in self.section.contours))
+
+        store = point_store.PointStore(self.tempdir)
+        self.assertEqual(len(store), len(self.section.contours))
+        self.assertEqual(store.sections(), [98])
+        self.assertEqual(store.contour_count(98), len(self.section.contours))
+        self.assertEqual(store.contour_count(99), 0)
+        for ordinal, contour in enumerate(self.section.contours):
+            points = store.get(98, ordinal)
+            self.assertIsInstance(points, Points)
+            self.assertEqual(points, contour.points)
+        self.assertRaises(KeyError, store.get, 98, len(self.section.contours))
+        self.assertRaises(KeyError, store.get, 99, 0)
+
+        # Exporting a loaded Series gives the same store
+        other = tempfile.mkdtemp()
+        try:
+            point_store.export_point_store(self.series, other)
+            other_store = point_store.PointStore(other)
+            self.assertTrue(numpy.array_equal(other_store.offsets, store.offsets))
+            self.assertTrue(numpy.array_equal(other_store.points, store.points))
+        finally:
+            shutil.rmtree(other)
+
+    def test_attach(self):
+        point_store.export_point_store(DATA_LOC, self.tempdir)
+        store = point_store.PointStore(self.tempdir)
+        expected = [contour.points.copy() for contour in self.section.contours]
+        store.attach(self.series)
+        for contour, points in zip(self.section.contours, expected):
+            self.assertEqual(contour.points, points)
+            self.assertFalse(contour.points.flags.writeable)
+            self.assertTrue(numpy.may_share_memory(contour.points, store.points))
+        self.assertTrue(self.section.contours[0].shape.is_valid)
+
+        self.section.contours.pop()
+        self.assertRaises(ValueError, store.attach, self.series)
@@ -1,9 +1,17 @@
 import os
+import re
+import shutil
+import tempfile
 from unittest import TestCase
 
+import numpy
 from lxml import etree
 
-from pyrecon.classes import Section, Series
+from pyrecon.classes import Contour, Section, Series, Transform
+from pyrecon.classes.compact import (
+    CompactContour, CompactImage, CompactSection, CompactTransform,
+    CompactZContour
+)
 from pyrecon.tools import reconstruct_reader
 
 DATA_LOC = "tests/tools/_data"
@@ -17,6 +25,163 @@ class ReconstructReaderTests(TestCase):
         self.assertIsInstance(series, Series)
         self.assertIsNotNone(series.contours)
 
+    def test_process_series_directory_workers(self):
+        path = DATA_LOC
+        series = reconstruct_reader.process_series_directory(path)
+        for threads in (False, True):
+            parallel_series = reconstruct_reader.process_series_directory(
+                path, workers=2, threads=threads)
+            self.assertEqual(
+                [section.index for section in parallel_series.sections],
+                [section.index for section in series.sections],
+            )
+            for section1, section2 in zip(series.sections, parallel_series.sections):
+                self.assertTrue(section1.eq(section2, "attributes"))
+                self.assertTrue(section1.eq(section2, "contours"))
+
+    def test_process_series_directory_lazy(self):
+        series = reconstruct_reader.process_series_directory(
+            DATA_LOC, lazy=True, cache_size=1)
+        self.assertIsInstance(series.sections, reconstruct_reader.LazySections)
+        self.assertEqual(len(series.sections), 1)
+        self.assertEqual(series.sections.indices, [98])
+        self.assertEqual(len(series.sections._cache), 0)
+
+        section = series.sections[0]
+        self.assertIsInstance(section, Section)
+        self.assertEqual(section.index, 98)
+        self.assertEqual(len(section.contours), 7)
+        self.assertIs(series.sections.get(98), section)
+        self.assertEqual([s.index for s in series.sections], [98])
+        self.assertRaises(KeyError, series.sections.get, 99)
+
+    def test_lazy_sections_cache_size(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        paths = []
+        for index in (2, 1):
+            path = os.path.join(directory, "_VRJXH.{}".format(index))
+            shutil.copy(os.path.join(DATA_LOC, "_VRJXH.98"), path)
+            paths.append(path)
+
+        sections = reconstruct_reader.LazySections(paths, cache_size=1)
+        self.assertEqual(sections.indices, [1, 2])
+        first = sections[0]
+        self.assertIs(sections[0], first)
+        sections[1]
+        self.assertEqual(list(sections._cache), [paths[0]])
+        self.assertIsNot(sections[0], first)
+
+    def test_process_series_directory_compact(self):
+        series = reconstruct_reader.process_series_directory(
+            DATA_LOC, compact=True)
+        section = series.sections[0]
+        self.assertIsInstance(section, CompactSection)
+        self.assertIsInstance(section.contours[0], CompactContour)
+        self.assertIsInstance(section.contours[0].transform, CompactTransform)
+        self.assertIsInstance(section.images[0], CompactImage)
+        self.assertIsInstance(series.contours[0], CompactContour)
+        self.assertIsInstance(series.zcontours[0], CompactZContour)
+
+        full_section = reconstruct_reader.process_section_file(
+            os.path.join(DATA_LOC, "_VRJXH.98"))
+        self.assertTrue(full_section.eq(section, "attributes"))
+        self.assertTrue(full_section.eq(section, "contours"))
+
+    def test_refresh_series(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            for filename in ("_VRJXH.ser", "_VRJXH.98"):
+                shutil.copy(os.path.join(DATA_LOC, filename), tempdir)
+            shutil.copy(os.path.join(DATA_LOC, "_VRJXH.98"),
+                        os.path.join(tempdir, "_VRJXH.99"))
+            for lazy in (False, True):
+                series = reconstruct_reader.process_series_directory(
+                    tempdir, lazy=lazy, track_changes=True)
+                sections = series.sections
+                section98 = series.sections[0]
+                self.assertEqual(
+                    series.refresh(),
+                    {"series": False, "changed": [], "added": [], "removed": []})
+                self.assertIs(series.sections[0], section98)
+
+                # Change, add and remove Section files
+                path = os.path.join(tempdir, "_VRJXH.99")
+                os.rename(path, os.path.join(tempdir, "_VRJXH.100"))
+                with open(os.path.join(tempdir, "_VRJXH.98"), "a") as f:
+                    f.write("\n")
+                self.assertEqual(
+                    series.refresh(),
+                    {"series": False, "changed": [98], "added": [100],
+                     "removed": [99]})
+                self.assertIs(series.sections, sections)
+                self.assertEqual(
+                    [section.index for section in series.sections], [98, 98])
+                self.assertIsNot(series.sections[0], section98)
+                self.assertEqual(
+                    [section.name for section in series.sections],
+                    ["_VRJXH.98", "_VRJXH.100"])
+
+                # Change the Series file
+                series_path = os.path.join(tempdir, "_VRJXH.ser")
+                with open(series_path) as f:
+                    text = f.read()
+                with open(series_path, "w") as f:
+                    f.write(text.replace('thumbWidth="128"', 'thumbWidth="256"'))
+                series.contours = []
+                report = series.refresh()
+                self.assertTrue(report["series"])
+                self.assertEqual(len(series.contours), 4)
+                self.assertEqual(series.thumbWidth, 256)
+                self.assertNotIn("_file_stats", series.attributes())
+                # The reloaded Series matches its file
+                self.assertFalse(series.is_dirty())
+                with open(series_path, "w") as f:
+                    f.write(text)
+
+                os.rename(os.path.join(tempdir, "_VRJXH.100"), path)
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_dirty_tracking(self):
+        # Untracked objects are always dirty
+        series = reconstruct_reader.process_series_directory(DATA_LOC)
+        self.assertIsNone(series._clean_fingerprint)
+        self.assertIsNone(series.sections[0]._clean_fingerprint)
+        self.assertTrue(series.is_dirty())
+        self.assertTrue(series.sections[0].is_dirty())
+        self.assertTrue(Section().is_dirty())
+
+        series = reconstruct_reader.process_series_directory(
+            DATA_LOC, track_changes=True)
+        section = series.sections[0]
+        self.assertFalse(series.is_dirty())
+        self.assertFalse(section.is_dirty())
+
+        edits = [
+            lambda: section.contours.pop(),
+            lambda: section.contours.append(section.contours[0]),
+            lambda: setattr(section, "thickness", 0.05),
+            lambda: setattr(section.contours[0], "name", "renamed"),
+            lambda: section.contours[0].transform.xcoef.__setitem__(0, 1),
+            lambda: section.contours[0].points.__setitem__((0, 0), 1.5),
+            lambda: setattr(section.images[0], "src", "other.tif"),
+        ]
+        for edit in edits:
+            section = reconstruct_reader.process_section_file(
+                os.path.join(DATA_LOC, "_VRJXH.98"), track_changes=True)
+            edit()
+            self.assertTrue(section.is_dirty())
+            section.mark_clean()
+            self.assertFalse(section.is_dirty())
+
+        series.zcontours.pop()
+        self.assertTrue(series.is_dirty())
+
+    def test_get_section_paths(self):
+        section_paths = reconstruct_reader.get_section_paths(DATA_LOC, "_VRJXH")
+        self.assertEqual(section_paths, [os.path.join(DATA_LOC, "_VRJXH.98")])
+
     def test_process_series_file(self):
         path = os.path.join(DATA_LOC, "_VRJXH.ser")
         series = reconstruct_reader.process_series_file(path)
@@ -35,6 +200,92 @@ class ReconstructReaderTests(TestCase):
         self.assertEqual(len(section.contours), 7)
         self.assertEqual(len(section.images), 1)
 
+    def test_iter_section_file(self):
+        path = os.path.join(DATA_LOC, "_VRJXH.98")
+        section = reconstruct_reader.process_section_file(path)
+        objects = list(reconstruct_reader.iter_section_file(path))
+        self.assertIsInstance(objects[0], Section)
+        self.assertEqual(objects[0].attributes(), section.attributes())
+        self.assertEqual(objects[0].contours, [])
+        self.assertEqual(
+            [type(obj).__name__ for obj in objects[1:3]], ["Transform", "Image"])
+        self.assertEqual(objects[2].attributes(), section.images[0].attributes())
+        contours = [obj for obj in objects if isinstance(obj, Contour)]
+        self.assertEqual(contours, section.contours)
+        transforms = [obj for obj in objects if isinstance(obj, Transform)]
+        self.assertEqual(len(transforms), 6)
+        for contour in contours:
+            self.assertTrue(any(contour.transform is t for t in transforms))
+
+    def test_iter_section_file_errors(self):
+        transform = '<Transform dim="0" xcoef="0 1 0 0 0 0" ycoef="0 0 1 0 0 0">{}</Transform>'
+        image = '<Image mag="1" contrast="1" brightness="0" red="true" green="true" blue="true" src="a.tif"/>'
+        contour = ('<Contour name="a" hidden="false" closed="true" simplified="false" '
+                   'border="1 0 1" fill="1 0 1" mode="11" points="0 0, 1 0, 1 1,"/>')
+        bodies = [
+            image + image + contour,
+            image + contour + contour,
+            contour + contour + image,
+            image,
+        ]
+        tempdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempdir, "test.1")
+            for body in bodies:
+                with open(path, "w") as f:
+                    f.write('<Section index="1" thickness="0.05" alignLocked="false">{}</Section>'.format(
+                        transform.format(body)))
+                self.assertRaises(Exception, reconstruct_reader.process_section_file, path)
+                self.assertRaises(Exception, list, reconstruct_reader.iter_section_file(path))
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_iter_series_contours(self):
+        section = reconstruct_reader.process_section_file(
+            os.path.join(DATA_LOC, "_VRJXH.98"))
+        results = list(reconstruct_reader.iter_series_contours(DATA_LOC))
+        self.assertEqual([index for index, _ in results], [98] * 7)
+        self.assertEqual([contour for _, contour in results], section.contours)
+
+        def names(**kwargs):
+            return [contour.name for _, contour in
+                    reconstruct_reader.iter_series_contours(DATA_LOC, **kwargs)]
+
+        self.assertEqual(names(name="d04*"), ["d04_p_08_m", "d04plin08", "d04plin08"])
+        self.assertEqual(names(name="d04plin08"), ["d04plin08", "d04plin08"])
+        self.assertEqual(names(name=re.compile(r"d98_")), ["d98_cfa_03_perf", "d98_c_03"])
+        self.assertEqual(names(closed=False), ["d98_cfa_03_perf"])
+        self.assertEqual(names(hidden=True), [])
+        self.assertEqual(names(indices=xrange(90, 99)), [c.name for c in section.contours])
+        self.assertEqual(names(indices=xrange(99, 200)), [])
+        # Image Contours are not Section Contours
+        self.assertEqual(names(name="domain1"), [])
+        self.assertEqual(names(name="missing"), [])
+
+    def test_iter_series_contours_escaped_names(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            shutil.copy(os.path.join(DATA_LOC, "_VRJXH.ser"), tempdir)
+            with open(os.path.join(DATA_LOC, "_VRJXH.98")) as f:
+                text = f.read()
+            # Names need not be escaped as xml.sax.saxutils.escape would
+            text = text.replace('name="d04_p_08_m"', 'name="a>b"')
+            text = text.replace('name="d123_p_07"', 'name="c&#38;d"')
+            with open(os.path.join(tempdir, "_VRJXH.98"), "w") as f:
+                f.write(text)
+            for name in ("a>b", "c&d"):
+                contours = reconstruct_reader.iter_series_contours(
+                    tempdir, name=name)
+                self.assertEqual(
+                    [contour.name for _, contour in contours], [name])
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_file_contains(self):
+        path = os.path.join(DATA_LOC, "_VRJXH.98")
+        self.assertTrue(reconstruct_reader.file_contains(path, "d04plin08"))
+        self.assertFalse(reconstruct_reader.file_contains(path, "missing"))
+
     def test_extract_series_contour_attributes(self):
         node = etree.parse(os.path.join(DATA_LOC, "_series_contour.xml")).getroot()
         series_contour_attributes = reconstruct_reader.extract_series_contour_attributes(
@@ -292,3 +543,17 @@ class ReconstructReaderTests(TestCase):
             'fill': (1.0, 0.5, 0.0),
         }
         self.assertEqual(zcontour_attributes, expected_attributes)
+
+    def test_get_points_array(self):
+        node = etree.parse(os.path.join(DATA_LOC, "_section_contour.xml")).getroot()
+        points = reconstruct_reader.get_points_array(node.get("points"))
+        self.assertEqual(points.shape, (4, 2))
+        self.assertEqual(points.dtype, numpy.float64)
+        self.assertEqual(
+            points.tolist(),
+            [list(pt) for pt in reconstruct_reader._get_points_float(node.get("points"))],
+        )
+        self.assertEqual(reconstruct_reader.get_points_array("").shape, (0, 2))
+        self.assertEqual(reconstruct_reader.get_points_array("1 2, 3 4").shape, (2, 2))
+        self.assertRaises(ValueError, reconstruct_reader.get_points_array, "1 2, 3,")
+        self.assertRaises(ValueError, reconstruct_reader.get_points_array, "1 2, x 4")
@@ -1,4 +1,6 @@
 import os
+import shutil
+import tempfile
 from unittest import TestCase
 
 from lxml import etree
@@ -99,6 +101,28 @@ class ReconstructWriterTests(TestCase):
             xml_element_to_dict(xml_out),
         )
 
+    def test_format_points(self):
+        values = [0.0, -0.0, 1.0, -2.5, 13183.0, 21.7326, 1e16, 1.5e-7,
+                  123456789012.0, 1234567890123.0, 2.0 / 3, -7.9999999999999,
+                  float("inf"), float("nan")]
+        points = [(x, y) for x in values for y in values]
+        self.assertEqual(
+            reconstruct_writer.format_points(
+                points, reconstruct_writer.STR_FLOAT + " " + reconstruct_writer.STR_FLOAT),
+            ",     ".join([" ".join(map(str, map(float, list(pt)))) for pt in points]) + ",     ")
+        finite = [pt for pt in points if all(abs(x) < float("inf") for x in pt)]
+        self.assertEqual(
+            reconstruct_writer.format_points(
+                finite, reconstruct_writer.STR_INT + " " + reconstruct_writer.STR_INT),
+            ",     ".join([" ".join(map(str, map(int, list(pt)))) for pt in finite]) + ",     ")
+        points3 = [(x, y, z) for x, y in points[:40] for z in values]
+        self.assertEqual(
+            reconstruct_writer.format_points(
+                points3, reconstruct_writer.STR_FLOAT + " " + reconstruct_writer.STR_FLOAT + " %g"),
+            ",     ".join(["{} {} {:g}".format(*map(float, list(pt))) for pt in points3]) + ",     ")
+        self.assertEqual(
+            reconstruct_writer.format_points([], reconstruct_writer.STR_FLOAT), ",     ")
+
     def test_entire_section_to_xml(self):
         section_path = os.path.join(DATA_LOC, "_VRJXH.98")
         xml_in = etree.parse(section_path).getroot()
@@ -106,9 +130,222 @@ class ReconstructWriterTests(TestCase):
         xml_out = reconstruct_writer.entire_section_to_xml(section)
         # NOTE: need to compare
 
+    def test_entire_section_to_xml_transform_groups(self):
+        section = reconstruct_reader.process_section_file(
+            os.path.join(DATA_LOC, "_VRJXH.98"))
+        template = section.contours[0]
+        shifted = [Transform(dim=1, xcoef=[i, 1, 0, 0, 0, 0], ycoef=[0, 0, 1, 0, 0, 0])
+                   for i in range(3)]
+        section.contours = [
+            Contour(name="c{}".format(i), comment=template.comment,
+                    hidden=False, closed=True, simplified=False, mode=11,
+                    border=(1, 0, 0), fill=(1, 0, 0), points=template.points,
+                    transform=Transform(dim=1, xcoef=list(shifted[i % 3].xcoef),
+                                        ycoef=list(shifted[i % 3].ycoef)))
+            for i in range(7)
+        ]
+        xml_out = reconstruct_writer.entire_section_to_xml(section)
+        transforms = xml_out[len(section.images):]
+        # Contours are grouped under equivalent Transforms in order of appearance
+        self.assertEqual(
+            [transform.get("xcoef") for transform in transforms],
+            [" 0 1 0 0 0 0", " 1 1 0 0 0 0", " 2 1 0 0 0 0"])
+        self.assertEqual(
+            [[contour.get("name") for contour in transform] for transform in transforms],
+            [["c0", "c3", "c6"], ["c1", "c4"], ["c2", "c5"]])
+
+    def test_write_series_only_dirty(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            for filename in ("_VRJXH.ser", "_VRJXH.98"):
+                shutil.copy(os.path.join(DATA_LOC, filename), tempdir)
+            shutil.copy(os.path.join(DATA_LOC, "_VRJXH.98"),
+                        os.path.join(tempdir, "_VRJXH.99"))
+
+            def mtimes():
+                return dict((filename, os.stat(os.path.join(tempdir, filename)).st_mtime)
+                            for filename in os.listdir(tempdir))
+
+            for lazy in (False, True):
+                for filename in os.listdir(tempdir):
+                    os.utime(os.path.join(tempdir, filename), (0, 0))
+                series = reconstruct_reader.process_series_directory(
+                    tempdir, lazy=lazy, track_changes=True)
+                reconstruct_writer.write_series(
+                    series, tempdir, sections=True, overwrite=True, only_dirty=True)
+                self.assertEqual(set(mtimes().values()), set([0]))
+
+                section = [section for section in series.sections
+                           if section.name == "_VRJXH.99"][0]
+                section.contours.pop()
+                self.assertTrue(section.is_dirty())
+                reconstruct_writer.write_series(
+                    series, tempdir, sections=True, overwrite=True, only_dirty=True)
+                changed = [name for name, mtime in mtimes().items() if mtime]
+                self.assertEqual(changed, ["_VRJXH.99"])
+                self.assertFalse(section.is_dirty())
+                self.assertEqual(
+                    len(reconstruct_reader.process_section_file(
+                        os.path.join(tempdir, "_VRJXH.99")).contours),
+                    len(section.contours))
+
+                # Files missing from the target directory are written
+                other = os.path.join(tempdir, "other")
+                reconstruct_writer.write_series(
+                    series, other, sections=True, only_dirty=True)
+                self.assertEqual(
+                    sorted(os.listdir(other)), ["_VRJXH.98", "_VRJXH.99", "_VRJXH.ser"])
+                self.assertFalse(series.is_dirty())
+                shutil.rmtree(other)
+
+                # Same-named files that are not the Series' own are replaced
+                foreign = os.path.join(tempdir, "foreign")
+                os.makedirs(foreign)
+                for source, filename in (("_VRJXH.ser", "_VRJXH.ser"),
+                                         ("_VRJXH.98", "_VRJXH.98"),
+                                         ("_VRJXH.98", "_VRJXH.99")):
+                    path = os.path.join(foreign, filename)
+                    shutil.copy(os.path.join(DATA_LOC, source), path)
+                    os.utime(path, (0, 0))
+                reconstruct_writer.write_series(
+                    series, foreign, sections=True, overwrite=True, only_dirty=True)
+                for filename in os.listdir(foreign):
+                    self.assertTrue(
+                        os.stat(os.path.join(foreign, filename)).st_mtime)
+                self.assertEqual(
+                    len(reconstruct_reader.process_section_file(
+                        os.path.join(foreign, "_VRJXH.99")).contours),
+                    len(section.contours))
+                shutil.rmtree(foreign)
+
+            # Without track_changes every file is written
+            series = reconstruct_reader.process_series_directory(tempdir)
+            for filename in os.listdir(tempdir):
+                os.utime(os.path.join(tempdir, filename), (0, 0))
+            reconstruct_writer.write_series(
+                series, tempdir, sections=True, overwrite=True, only_dirty=True)
+            self.assertNotIn(0, mtimes().values())
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_write_series_atomic(self):
+        series = reconstruct_reader.process_series_directory(DATA_LOC)
+        tempdir = tempfile.mkdtemp()
+        try:
+            expected_dir = os.path.join(tempdir, "expected")
+            atomic_dir = os.path.join(tempdir, "atomic")
+            reconstruct_writer.write_series(series, expected_dir, sections=True)
+            reconstruct_writer.write_series(
+                series, atomic_dir, sections=True, atomic=True, fsync_batch=1)
+            filenames = ["_VRJXH.98", "_VRJXH.ser"]
+            self.assertEqual(sorted(os.listdir(atomic_dir)), filenames)
+            for filename in filenames:
+                with open(os.path.join(expected_dir, filename)) as f:
+                    expected = f.read()
+                with open(os.path.join(atomic_dir, filename)) as f:
+                    self.assertEqual(f.read(), expected)
+                self.assertEqual(
+                    os.stat(os.path.join(atomic_dir, filename)).st_mode,
+                    os.stat(os.path.join(expected_dir, filename)).st_mode)
+
+            # The previous generation can be kept
+            section_path = os.path.join(atomic_dir, "_VRJXH.98")
+            with open(section_path, "w") as f:
+                f.write("previous")
+            reconstruct_writer.write_series(
+                series, atomic_dir, sections=True, overwrite=True, atomic=True,
+                keep_previous=True)
+            previous_dir = os.path.join(atomic_dir, reconstruct_writer.PREVIOUS_DIRNAME)
+            self.assertEqual(sorted(os.listdir(previous_dir)), filenames)
+            with open(os.path.join(previous_dir, "_VRJXH.98")) as f:
+                self.assertEqual(f.read(), "previous")
+            with open(section_path) as f:
+                written = f.read()
+            with open(os.path.join(expected_dir, "_VRJXH.98")) as f:
+                self.assertEqual(written, f.read())
+
+            # Nothing is replaced if writing fails
+            with open(section_path, "w") as f:
+                f.write("previous")
+            series.sections.append(Section(name="_VRJXH.99", index=99, contours=[
+                Contour(name="broken", points=[(0, 0)], transform=None)]))
+            self.assertRaises(
+                AttributeError, reconstruct_writer.write_series, series,
+                atomic_dir, sections=True, overwrite=True, atomic=True)
+            self.assertEqual(
+                sorted(os.listdir(atomic_dir)),
+                [reconstruct_writer.PREVIOUS_DIRNAME] + filenames)
+            with open(section_path) as f:
+                self.assertEqual(f.read(), "previous")
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_write_section_stream(self):
+        section = reconstruct_reader.process_section_file(
+            os.path.join(DATA_LOC, "_VRJXH.98"))
+        images = section.images
+        contours = section.contours
+        tempdir = tempfile.mkdtemp()
+        try:
+            for section.images, section.contours in [
+                    (images, contours), (images, []), ([], contours), ([], [])]:
+                reconstruct_writer.write_section(
+                    section, tempdir, outpath=os.path.join(tempdir, "tree"))
+                reconstruct_writer.write_section(
+                    section, tempdir, outpath=os.path.join(tempdir, "stream"),
+                    stream=True)
+                with open(os.path.join(tempdir, "tree"), "rb") as f:
+                    expected = f.read()
+                with open(os.path.join(tempdir, "stream"), "rb") as f:
+                    self.assertEqual(f.read(), expected)
+                os.remove(os.path.join(tempdir, "tree"))
+                os.remove(os.path.join(tempdir, "stream"))
+        finally:
+            shutil.rmtree(tempdir)
+
     def test_entire_series_to_xml(self):
         series_path = os.path.join(DATA_LOC, "_VRJXH.ser")
         xml_in = etree.parse(series_path).getroot()
         series = reconstruct_reader.process_series_file(series_path)
         xml_out = reconstruct_writer.entire_series_to_xml(series)
         # NOTE: need to compare
+
+    def test_write_series_workers(self):
+        series = reconstruct_reader.process_series_directory(DATA_LOC)
+        section = series.sections[0]
+        series.sections = [section]
+        for index in (99, 100):
+            other = reconstruct_reader.process_section_file(
+                os.path.join(DATA_LOC, "_VRJXH.98"))
+            other.name = "_VRJXH.{}".format(index)
+            other.index = index
+            series.sections.append(other)
+        serial_dir = tempfile.mkdtemp()
+        parallel_dir = tempfile.mkdtemp()
+        try:
+            reconstruct_writer.write_series(
+                series, serial_dir, sections=True, overwrite=True)
+            reconstruct_writer.write_series(
+                series, parallel_dir, sections=True, overwrite=True, workers=2)
+            filenames = sorted(os.listdir(serial_dir))
+            self.assertEqual(
+                filenames, ["_VRJXH.100", "_VRJXH.98", "_VRJXH.99", "_VRJXH.ser"])
+            self.assertEqual(sorted(os.listdir(parallel_dir)), filenames)
+            for filename in filenames:
+                with open(os.path.join(serial_dir, filename)) as f:
+                    serial = f.read()
+                with open(os.path.join(parallel_dir, filename)) as f:
+                    self.assertEqual(f.read(), serial)
+
+            # Existing Sections are not overwritten unless asked
+            path = os.path.join(parallel_dir, "_VRJXH.99")
+            with open(path, "w") as f:
+                f.write("edited")
+            reconstruct_writer.write_series(
+                series, parallel_dir, outpath=os.path.join(parallel_dir, "new.ser"),
+                sections=True, workers=2)
+            with open(path) as f:
+                self.assertEqual(f.read(), "edited")
+        finally:
+            shutil.rmtree(serial_dir)
+            shutil.rmtree(parallel_dir)
@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from pyrecon.classes.compact import CompactContour
+from pyrecon.tools import reconstruct_reader, section_cache
+
+
+DATA_LOC = "tests/tools/_data"
+
+
+class SectionCacheTests(TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        for filename in ("_VRJXH.ser", "_VRJXH.98"):
+            shutil.copy(os.path.join(DATA_LOC, filename), self.tempdir)
+        self.path = os.path.join(self.tempdir, "_VRJXH.98")
+        self.cache_path = section_cache.get_cache_path(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def assertSectionsEqual(self, section1, section2):
+        self.assertEqual(section1.name, section2.name)
+        self.assertEqual(section1._path, section2._path)
+        self.assertEqual(section1.attributes(), section2.attributes())
+        self.assertEqual(section1.images, section2.images)
+        self.assertEqual(
+            [image.attributes() for image in section1.images],
+            [image.attributes() for image in section2.images])
+        self.assertEqual(section1.contours, section2.contours)
+        for contour1, contour2 in zip(section1.contours, section2.contours):
+            self.assertEqual(contour1.comment, contour2.comment)
+            self.assertEqual(contour1.hidden, contour2.hidden)
+            self.assertEqual(contour1.transform.xcoef, contour2.transform.xcoef)
+            self.assertEqual(
+                [type(x) for x in contour1.transform.xcoef],
+                [type(x) for x in contour2.transform.xcoef])
+
+    def test_process_section_file_cached(self):
+        expected = reconstruct_reader.process_section_file(self.path)
+        self.assertFalse(os.path.exists(self.cache_path))
+        section = section_cache.process_section_file_cached(self.path)
+        self.assertSectionsEqual(section, expected)
+        self.assertTrue(os.path.exists(self.cache_path))
+
+        key = section_cache.get_file_key(self.path)
+        cached = section_cache.load_section(self.cache_path, key)
+        self.assertSectionsEqual(cached, expected)
+        # Contours of one Transform element still share a Transform
+        self.assertEqual(
+            len(set(id(contour.transform) for contour in cached.contours)),
+            len(set(id(contour.transform) for contour in expected.contours)))
+
+        compact = section_cache.load_section(self.cache_path, key, compact=True)
+        self.assertIsInstance(compact.contours[0], CompactContour)
+
+    def test_stale_cache(self):
+        section_cache.process_section_file_cached(self.path)
+        with open(self.path, "a") as f:
+            f.write("\n")
+        key = section_cache.get_file_key(self.path)
+        self.assertIsNone(section_cache.load_section(self.cache_path, key))
+
+        # Same size and mtime, different content
+        section_cache.process_section_file_cached(self.path)
+        stat = os.stat(self.path)
+        with open(self.path, "r+") as f:
+            f.seek(-2, os.SEEK_END)
+            f.write(" ")
+        os.utime(self.path, (stat.st_atime, stat.st_mtime))
+        key = section_cache.get_file_key(self.path)
+        self.assertIsNone(section_cache.load_section(self.cache_path, key))
+
+    def test_corrupt_cache(self):
+        expected = reconstruct_reader.process_section_file(self.path)
+        os.makedirs(os.path.dirname(self.cache_path))
+        with open(self.cache_path, "w") as f:
+            f.write("not a cache")
+        key = section_cache.get_file_key(self.path)
+        self.assertIsNone(section_cache.load_section(self.cache_path, key))
+        section = section_cache.process_section_file_cached(self.path)
+        self.assertSectionsEqual(section, expected)
+        self.assertIsNotNone(section_cache.load_section(self.cache_path, key))
+
+    def test_cache_dir(self):
+        cache_dir = os.path.join(self.tempdir, "cache")
+        cache_path = section_cache.get_cache_path(self.path, cache_dir)
+        self.assertEqual(os.path.dirname(cache_path), cache_dir)
+        self.assertNotEqual(
+            cache_path,
+            section_cache.get_cache_path(os.path.join(DATA_LOC, "_VRJXH.98"), cache_dir))
+
+        series = reconstruct_reader.process_series_directory(
+            self.tempdir, cache=True, cache_dir=cache_dir)
+        self.assertTrue(os.path.exists(cache_path))
+        self.assertFalse(os.path.exists(self.cache_path))
+        cached = reconstruct_reader.process_series_directory(
+            self.tempdir, cache=True, cache_dir=cache_dir, lazy=True)
+        self.assertSectionsEqual(cached.sections[0], series.sections[0])